@@ -49,9 +49,9 @@ _BASE_OS_ENVIRON = dict(os.environ.copy())
 class LauncherApp(WebEngineDialogBase):
 
     BTN_HTML_TEMPLATE = '''
-<button class="btn btn-secondary tool_img_btn" onclick="launch_app('{APP}');" style="padding: 4px;"
-        title="{LABEL}">
-    <img class="tool_img highlight" src="file://{ICON_PATH}" />
+<button class="btn btn-secondary tool_img_btn" onclick="launch_app('{{ item.app }}');" style="padding: 4px;"
+        title="{{ item.label }}">
+    <img class="tool_img highlight" src="file://{{ item.icon_path }}" />
 </button>'''
 
     def __init__(self, parent=None, html_filepath='', app_title='', width=500, height=200,
@@ -60,7 +60,8 @@ class LauncherApp(WebEngineDialogBase):
         super(LauncherApp, self).__init__(parent=parent, app_module_path=os.path.abspath(__file__),
                                           html_filepath='', app_title=app_title, width=width, height=height,
                                           requested_plugins_list=None, override_session_log_filepath='',
-                                          log_level_str=log_level_str, log_to_shell=log_to_shell)
+                                          log_level_str=log_level_str, log_to_shell=log_to_shell,
+                                          cache_external_assets=True)  # Bootstrap, jQuery, etc. from CDNs
 
         # Do any required data set-up for your app here
         self.launcher_config_d = {}
@@ -70,6 +71,10 @@ class LauncherApp(WebEngineDialogBase):
         print('>>> log_file_root: %s' % log_file_root)
         print('')
 
+        # the log location changes every session, so it's filled in here instead of through a template var
+        # (which would keep the page from ever being served from the page cache)
+        self.patch_html('log_file_root_pre', self.render_fragment('{{ path }}', path=self.get_session_temp_root()))
+
     # --------------------------------------------------------------------------------------------------------
     # "setup_extra_template_vars()" is a REQUIRED override method
     #
@@ -78,7 +83,6 @@ class LauncherApp(WebEngineDialogBase):
     def setup_extra_template_vars(self):
 
         return {
-            'LOG_FILE_ROOT': self.get_session_temp_root(),
             'USER_LOGIN': getpass.getuser(),
         }
 
@@ -126,6 +130,7 @@ class LauncherApp(WebEngineDialogBase):
             with open(launcher_config_file, 'r') as fp:
                 self.launcher_config_d = json.load(fp)
 
+            btn_item_list = []
             for app_button_info in self.launcher_config_d.get('app_buttons', []):
 
                 exe_path = self._get_btn_info_exe_path(app_button_info)
@@ -133,13 +138,15 @@ class LauncherApp(WebEngineDialogBase):
                     continue
 
                 app_button_info['exe_path'] = exe_path
-                icon_path = os.path.expandvars(app_button_info['icon_path'])
-                btn_entry_html_str = self.BTN_HTML_TEMPLATE.format(
-                                            LABEL=app_button_info['label'],
-                                            ICON_PATH=icon_path,
-                                            APP=app_button_info['app'])
-
-                self.call_js_op('add_app_button', {'btn_entry_html': btn_entry_html_str})
+                btn_item_list.append({
+                    'label': app_button_info['label'],
+                    'icon_path': os.path.expandvars(app_button_info['icon_path']),
+                    'app': app_button_info['app'],
+                })
+
+            # all buttons are rendered in one pass and sent as one fragment, which is skipped if the buttons
+            # haven't changed since the last time
+            self.patch_html('app_buttons_div', self.render_fragment_list(self.BTN_HTML_TEMPLATE, btn_item_list))
         except:
             self.error('')
             self.error(traceback.format_exc())
@@ -6,12 +6,24 @@ function PyWebEngineGui()
     _self.python_backend = null;
     _self.active_plugins = [];
 
+    // Message codec matching the Python side message codec ... all Python codecs produce JSON text
+    _self.encode_message = JSON.stringify;
+    _self.decode_message = JSON.parse;
+
     // ------------------------------------------------------
     // pweg.init() must be called on event 'DOMContentLoaded'
     // ------------------------------------------------------
     _self.init = function() {
         _self.python_backend = new Promise((resolve, reject) => {
-            new QWebChannel(qt.webChannelTransport, (channel) => resolve(channel.objects.python_bridge));
+            new QWebChannel(qt.webChannelTransport, (channel) => {
+                // JS ops called from Python arrive through this signal, in batches
+                channel.objects.python_bridge.js_ops_pushed.connect(_self._call_js_op_batch);
+
+                // handshake ... Python holds JS ops (and run_js calls) made before this point and sends
+                // them now
+                channel.objects.python_bridge.channel_ready();
+                resolve(channel.objects.python_bridge);
+            });
         });
 
         // init plugins
@@ -20,31 +32,184 @@ function PyWebEngineGui()
         }
     };
 
+    // response handlers for ops registered with background=True, keyed by request id, waiting on
+    // their "PWEG_op_result" JS op from the Python side
+    _self._next_request_id = 0;
+    _self._pending_response_handlers = {};
+    _self._pending_chunk_handlers = {};
+
+    // ----------------------------------------------------------------------------------------------
+    // Returns a handle, which is a Promise of the op result that also has:
+    //
+    //     handle.request_id
+    //     handle.cancel()  ... the response handler then never gets called (and the Promise rejects
+    //                          with {'cancelled': true}). Ops registered with cancellable=True see the
+    //                          cancel through their cancel token.
+    // ----------------------------------------------------------------------------------------------
     _self.to_python = function(op, op_data, response_handler_fn)
     {
-        const result = document.getElementById('result'); 
-        const data_to_send = {'op': op, 'op_data': op_data};
+        _self._next_request_id += 1;
+        const request_id = String(_self._next_request_id);
+        const data_to_send = {'op': op, 'op_data': op_data, 'request_id': request_id};
+
+        let resolve_fn = null;
+        let reject_fn = null;
+        const handle = new Promise((resolve, reject) => { resolve_fn = resolve; reject_fn = reject; });
+        handle.catch(() => {});  // cancelling is not an error for callers who only use response_handler_fn
+
+        // registered up front so a background result can never arrive before its handler
+        _self._pending_response_handlers[request_id] = (result_data) => {
+            resolve_fn(result_data);
+            if (response_handler_fn) {
+                response_handler_fn(result_data);
+            }
+        };
+
+        handle.request_id = request_id;
+        handle.cancel = function() {
+            if (!(request_id in _self._pending_response_handlers)) {
+                return false;  // already completed or cancelled
+            }
+            delete _self._pending_response_handlers[request_id];
+            delete _self._pending_chunk_handlers[request_id];
+            reject_fn({'cancelled': true, 'request_id': request_id});
+
+            _self.python_backend.then((python_bridge) => { python_bridge.cancel_op(request_id); });
+            return true;
+        };
 
         _self.python_backend.then((python_bridge) => {
-            python_bridge.to_python(JSON.stringify(data_to_send), (prediction) => {
+            if (!(request_id in _self._pending_response_handlers)) {
+                return;  // cancelled before it was sent
+            }
+            python_bridge.to_python(_self.encode_message(data_to_send), (prediction) => {
                 // TODO: deterime if "prediction" is an error or not a JSON string, for now
                 //       assume it will be a JSON string with return result data
-                if (response_handler_fn) {
-                    try {
-                        const result_data = JSON.parse(prediction);
-                            response_handler_fn(result_data);
-                    }
-                    catch(err) {
-                        // TODO: output to js_log?
-                        _self.error_msg('pweg.to_python() returned with error: "' + err + '"'); // can we do this?
+                try {
+                    const result_data = _self.decode_message(prediction);
+                    if (result_data && result_data._pweg_background === request_id) {
+                        // op is running in the background, result is delivered by _op_result_received()
+                        return;
                     }
+                    _self._op_result_received({'request_id': request_id, 'result': result_data});
+                }
+                catch(err) {
+                    delete _self._pending_response_handlers[request_id];
+                    // TODO: output to js_log?
+                    _self.error_msg('pweg.to_python() returned with error: "' + err + '"'); // can we do this?
+                }
+            });
+        });
+
+        return handle;
+    };
+
+    // ----------------------------------------------------------------------------------------------
+    // For generator ops: on_chunk_fn gets each chunk as the Python op yields it, then on_done_fn gets
+    // the final result ({'ret_status': ..., 'chunk_count': ...}). Works for non-generator ops too, in
+    // which case on_done_fn just gets the op result. Returns the same kind of handle as to_python().
+    // ----------------------------------------------------------------------------------------------
+    _self.to_python_stream = function(op, op_data, on_chunk_fn, on_done_fn)
+    {
+        const handle = _self.to_python(op, op_data, (result_data) => {
+            delete _self._pending_chunk_handlers[handle.request_id];
+            if (on_done_fn) {
+                on_done_fn(result_data);
+            }
+        });
+        // NOTE: to_python() only sends once the python_backend promise resolves, so this is always
+        //       registered before any chunk can arrive
+        _self._pending_chunk_handlers[handle.request_id] = on_chunk_fn;
+        return handle;
+    };
+
+    _self._op_chunk_received = function(op_data) {
+        const on_chunk_fn = _self._pending_chunk_handlers[op_data.request_id];
+        if (on_chunk_fn) {
+            on_chunk_fn(op_data.chunk);
+        }
+    };
+
+    // ----------------------------------------------------------------------------------------------
+    // Runs several ops in one Python call. op_list is an array of {'op': ..., 'op_data': ...} objects,
+    // and response_handler_fn gets an array of results in the same order (an op that fails only gets
+    // an ERROR result in its own slot). Results for background ops are filled in as they complete.
+    // ----------------------------------------------------------------------------------------------
+    _self.to_python_batch = function(op_list, response_handler_fn)
+    {
+        const request_id_list = [];
+        const data_list_to_send = op_list.map((op_entry) => {
+            _self._next_request_id += 1;
+            const request_id = String(_self._next_request_id);
+            request_id_list.push(request_id);
+            return {'op': op_entry.op, 'op_data': op_entry.op_data, 'request_id': request_id};
+        });
+
+        let result_list = null;
+        let remaining_count = 0;
+        const early_bg_results = {};
+
+        const deliver_if_done = () => {
+            if (remaining_count === 0 && response_handler_fn) {
+                response_handler_fn(result_list);
+            }
+        };
+
+        // registered up front so a background result can never arrive before its handler
+        request_id_list.forEach((request_id, idx) => {
+            _self._pending_response_handlers[request_id] = (bg_result) => {
+                if (result_list === null) {
+                    early_bg_results[idx] = bg_result;
+                    return;
+                }
+                result_list[idx] = bg_result;
+                remaining_count -= 1;
+                deliver_if_done();
+            };
+        });
+
+        _self.python_backend.then((python_bridge) => {
+            python_bridge.to_python_batch(_self.encode_message(data_list_to_send), (prediction) => {
+                try {
+                    const batch_result_list = _self.decode_message(prediction);
+                    batch_result_list.forEach((result_data, idx) => {
+                        const request_id = request_id_list[idx];
+                        if (result_data && result_data._pweg_background === request_id) {
+                            if (idx in early_bg_results) {
+                                batch_result_list[idx] = early_bg_results[idx];
+                            } else {
+                                remaining_count += 1;
+                            }
+                            return;
+                        }
+                        delete _self._pending_response_handlers[request_id];
+                    });
+                    result_list = batch_result_list;
+                    deliver_if_done();
+                }
+                catch(err) {
+                    _self.error_msg('pweg.to_python_batch() returned with error: "' + err + '"');
                 }
-            });              
+            });
         });
     };
 
+    _self._op_result_received = function(op_data) {
+        const response_handler_fn = _self._pending_response_handlers[op_data.request_id];
+        delete _self._pending_response_handlers[op_data.request_id];
+
+        if (response_handler_fn) {
+            response_handler_fn(op_data.result);
+        }
+    };
+
     _self._msg = function(message, log_level) {
-        _self.to_python('print_from_js', {'message': message, 'log_level': log_level}, null);
+        // fire and forget ... "no_result" tells Python not to push back the result of the queued op
+        const data_to_send = {'op': 'print_from_js', 'op_data': {'message': message, 'log_level': log_level},
+                              'no_result': true};
+        _self.python_backend.then((python_bridge) => {
+            python_bridge.to_python(_self.encode_message(data_to_send), () => {});
+        });
     };
 
     _self.info_msg = function(message) { _self._msg(message, 'INFO'); };
@@ -57,9 +222,130 @@ function PyWebEngineGui()
         _self.js_op_registry[op_name] = op_fn;
     };
 
-    _self.call_js_op = function(op_name, b64_data_str) {
-        let decoded_str = window.atob(b64_data_str);
-        let op_data = JSON.parse(decoded_str);
+    _self._call_js_op_batch = function(batch_str) {
+        const op_batch = _self.decode_message(batch_str);
+        for (let c=0; c < op_batch.length; c++) {
+            try {
+                _self._dispatch_js_op(op_batch[c][0], op_batch[c][1]);
+            }
+            catch(err) {
+                // one failing JS op must not stop the rest of the batch
+                _self.error_msg('JS Op "' + op_batch[c][0] + '" failed with error: "' + err + '"');
+            }
+        }
+    };
+
+    // JS ops with typed array data ("PWEG_typed_op", see call_js_op_with_arrays() on the Python side) wait
+    // for their buffers to arrive ... JS ops pushed after one are chained behind it, so the order in which
+    // Python called them is kept
+    _self._pending_async_dispatch_count = 0;
+    _self._js_op_dispatch_chain = Promise.resolve();
+
+    _self._dispatch_js_op = function(op_name, op_data) {
+        if (op_name !== 'PWEG_typed_op' && _self._pending_async_dispatch_count === 0) {
+            _self.call_js_op(op_name, op_data);
+            return;
+        }
+        _self._pending_async_dispatch_count += 1;
+        _self._js_op_dispatch_chain = _self._js_op_dispatch_chain.then(() => {
+            if (op_name !== 'PWEG_typed_op') {
+                _self.call_js_op(op_name, op_data);
+                return;
+            }
+            return _self._resolve_typed_arrays(op_data.op_data).then((resolved_op_data) => {
+                _self.call_js_op(op_data.op, resolved_op_data);
+            });
+        }).catch((err) => {
+            const failed_op_name = (op_name === 'PWEG_typed_op') ? op_data.op : op_name;
+            _self.error_msg('JS Op "' + failed_op_name + '" failed with error: "' + err + '"');
+        }).then(() => {
+            _self._pending_async_dispatch_count -= 1;
+        });
+    };
+
+    _self._typed_array_class_by_dtype = {
+        'int8': Int8Array, 'uint8': Uint8Array, 'int16': Int16Array, 'uint16': Uint16Array,
+        'int32': Int32Array, 'uint32': Uint32Array, 'int64': BigInt64Array, 'uint64': BigUint64Array,
+        'float32': Float32Array, 'float64': Float64Array,
+    };
+
+    _self._decode_base64_buffer = function(b64_str) {
+        const byte_str = window.atob(b64_str);
+        const byte_array = new Uint8Array(byte_str.length);
+        for (let c=0; c < byte_str.length; c++) {
+            byte_array[c] = byte_str.charCodeAt(c);
+        }
+        return byte_array.buffer;
+    };
+
+    // Returns a Promise of data with every typed array descriptor replaced by its typed array (which also
+    // gets a "shape" property, for multi-dimensional numpy arrays)
+    _self._resolve_typed_arrays = function(data) {
+        let pending_list = [];
+
+        const _resolve = (container, key) => {
+            const value = container[key];
+            if (value === null || typeof value !== 'object') {
+                return;
+            }
+            if ('__pweg_typed_array__' in value) {
+                const descriptor = value['__pweg_typed_array__'];
+                const array_class = _self._typed_array_class_by_dtype[descriptor.dtype];
+                const buffer_promise = descriptor.url ?
+                    fetch(descriptor.url).then((response) => response.arrayBuffer()) :
+                    Promise.resolve(_self._decode_base64_buffer(descriptor.b64));
+                pending_list.push(buffer_promise.then((array_buffer) => {
+                    const typed_array = new array_class(array_buffer);
+                    typed_array.shape = descriptor.shape;
+                    container[key] = typed_array;
+                }));
+                return;
+            }
+            for (const child_key of Object.keys(value)) {
+                _resolve(value, child_key);
+            }
+        };
+
+        let root = {'data': data};
+        _resolve(root, 'data');
+        return Promise.all(pending_list).then(() => root.data);
+    };
+
+    _self.call_js_op = function(op_name, op_data) {
+        if (op_name === 'PWEG_op_result') {
+            _self._op_result_received(op_data);
+            return;
+        }
+
+        if (op_name === 'PWEG_op_chunk') {
+            _self._op_chunk_received(op_data);
+            return;
+        }
+
+        if (op_name === 'PWEG_state_patch') {
+            _self._apply_state_patch(op_data);
+            return;
+        }
+
+        if (op_name === 'PWEG_computed_values') {
+            _self._computed_values_received(op_data);
+            return;
+        }
+
+        if (op_name === 'PWEG_patch_html') {
+            _self.patch_html(op_data.target_id, op_data.html);
+            return;
+        }
+
+        if (op_name === 'PWEG_insert_fragment') {
+            _self.insert_fragment(op_data.target_id, op_data.html, op_data.position);
+            return;
+        }
+
+        if (op_name === 'PWEG_hot_reload') {
+            _self._hot_reload_plugin_component(op_data.plugin_name, op_data.component, op_data.content);
+            return;
+        }
 
         if (op_name.startsWith('Plugin|')) {
             let bits = op_name.split('|');
@@ -88,6 +374,263 @@ function PyWebEngineGui()
         }
     };
 
+    // ----------------------------------------------------------------------------------------------
+    // Mirror of the Python side StateStore, kept up to date by the JSON-patch deltas it sends. Paths are
+    // JSON pointers, e.g. "/shots/sh010/status" ("" is the whole state).
+    //
+    //     const unsubscribe = pweg.subscribe_state('/shots', (shots, changed_paths) => { ... });
+    //
+    // A subscriber is called (once per patch) when anything at, below or above its path changed.
+    // ----------------------------------------------------------------------------------------------
+    _self.state = {};
+    _self._state_subscriber_list = [];
+
+    _self._split_state_path = function(path) {
+        if (!path || path === '/') {
+            return [];
+        }
+        return path.replace(/^\//, '').split('/').map((k) => k.replace(/~1/g, '/').replace(/~0/g, '~'));
+    };
+
+    _self.get_state = function(path) {
+        let value = _self.state;
+        for (const key of _self._split_state_path(path)) {
+            if (value === null || typeof value !== 'object' || !(key in value)) {
+                return undefined;
+            }
+            value = value[key];
+        }
+        return value;
+    };
+
+    _self.subscribe_state = function(path, subscriber_fn) {
+        const subscriber = {'path': path || '', 'fn': subscriber_fn};
+        _self._state_subscriber_list.push(subscriber);
+        return () => {
+            _self._state_subscriber_list = _self._state_subscriber_list.filter((s) => s !== subscriber);
+        };
+    };
+
+    _self._apply_state_patch = function(patch_list) {
+        let changed_paths = [];
+        for (const patch of patch_list) {
+            const key_list = _self._split_state_path(patch.path);
+            changed_paths.push(patch.path);
+            if (!key_list.length) {
+                _self.state = (patch.op === 'remove') ? {} : patch.value;
+                continue;
+            }
+            let container = _self.state;
+            for (const key of key_list.slice(0, -1)) {
+                container = container[key];
+            }
+            const last_key = key_list[key_list.length - 1];
+            if (patch.op === 'remove') {
+                if (Array.isArray(container)) {
+                    container.splice(Number(last_key), 1);
+                } else {
+                    delete container[last_key];
+                }
+            } else {
+                container[last_key] = patch.value;
+            }
+        }
+
+        const _is_related = (path_a, path_b) => (
+            path_a === path_b || path_a === '' || path_b === '' ||
+            path_a.startsWith(path_b + '/') || path_b.startsWith(path_a + '/'));
+
+        for (const subscriber of _self._state_subscriber_list.slice()) {
+            if (!changed_paths.some((changed_path) => _is_related(subscriber.path, changed_path))) {
+                continue;
+            }
+            try {
+                subscriber.fn(_self.get_state(subscriber.path), changed_paths);
+            }
+            catch(err) {
+                _self.error_msg('State subscriber for "' + subscriber.path + '" failed with error: "' + err + '"');
+            }
+        }
+    };
+
+    // ----------------------------------------------------------------------------------------------
+    // Computed values defined on the Python side (see ComputedValueGraph), by name. The subscriber is
+    // called with the current value and then whenever the value changes.
+    //
+    //     const unsubscribe = pweg.subscribe_computed('shot_count', (shot_count) => { ... });
+    // ----------------------------------------------------------------------------------------------
+    _self._computed_subscribers_by_name = {};
+    _self._computed_value_by_name = {};
+
+    _self.subscribe_computed = function(name, subscriber_fn) {
+        if (name in _self._computed_subscribers_by_name) {
+            _self._computed_subscribers_by_name[name].push(subscriber_fn);
+            if (name in _self._computed_value_by_name) {
+                subscriber_fn(_self._computed_value_by_name[name]);
+            }
+        } else {
+            _self._computed_subscribers_by_name[name] = [subscriber_fn];
+            _self.to_python('pweg_subscribe_computed', {'name': name}, (result) => {
+                if (result.ret_status !== 'OK') {
+                    _self.error_msg('Subscribing to computed value "' + name + '" failed: ' + result.message);
+                    return;
+                }
+                _self._computed_values_received({[name]: result.value});
+            });
+        }
+
+        return () => {
+            const subscriber_list = (_self._computed_subscribers_by_name[name] || []).filter(
+                (fn) => fn !== subscriber_fn);
+            if (subscriber_list.length) {
+                _self._computed_subscribers_by_name[name] = subscriber_list;
+                return;
+            }
+            delete _self._computed_subscribers_by_name[name];
+            delete _self._computed_value_by_name[name];
+            _self.to_python('pweg_unsubscribe_computed', {'name': name});
+        };
+    };
+
+    _self._computed_values_received = function(value_by_name) {
+        for (const name of Object.keys(value_by_name)) {
+            if (!(name in _self._computed_subscribers_by_name)) {
+                continue;  // unsubscribed while the value was on its way
+            }
+            _self._computed_value_by_name[name] = value_by_name[name];
+            for (const subscriber_fn of _self._computed_subscribers_by_name[name].slice()) {
+                try {
+                    subscriber_fn(value_by_name[name]);
+                }
+                catch(err) {
+                    _self.error_msg('Computed value subscriber for "' + name + '" failed with error: "' + err + '"');
+                }
+            }
+        }
+    };
+
+    // ----------------------------------------------------------------------------------------------
+    // Sets the content of element target_id to the html fragment by morphing the live DOM into it ...
+    // matching nodes are updated in place (elements with an id are matched by id, others by position
+    // and tag), so only what actually differs is changed and focus, scroll position and the state of
+    // inputs being edited are kept.
+    // ----------------------------------------------------------------------------------------------
+    _self.patch_html = function(target_id, html) {
+        const target_el = document.getElementById(target_id);
+        if (!target_el) {
+            _self.warning_msg('pweg.patch_html(): no element with id "' + target_id + '"');
+            return;
+        }
+        const template_el = document.createElement('template');
+        template_el.innerHTML = html;
+        _self._morph_children(target_el, template_el.content);
+    };
+
+    // Inserts the html fragment into element target_id in one DOM operation ... position is "append"
+    // (default), "prepend" or "replace"
+    _self.insert_fragment = function(target_id, html, position) {
+        const target_el = document.getElementById(target_id);
+        if (!target_el) {
+            _self.warning_msg('pweg.insert_fragment(): no element with id "' + target_id + '"');
+            return;
+        }
+        const template_el = document.createElement('template');
+        template_el.innerHTML = html;
+        if (position === 'replace') {
+            target_el.textContent = '';
+            target_el.append(template_el.content);
+        } else if (position === 'prepend') {
+            target_el.prepend(template_el.content);
+        } else {
+            target_el.append(template_el.content);
+        }
+    };
+
+    _self._is_same_node_kind = function(from_node, to_node) {
+        if (from_node.nodeType !== to_node.nodeType || from_node.nodeName !== to_node.nodeName) {
+            return false;
+        }
+        return (from_node.nodeType !== Node.ELEMENT_NODE) || (from_node.id === to_node.id);
+    };
+
+    _self._morph_children = function(from_parent, to_parent) {
+        let old_el_by_id = {};
+        for (const child of from_parent.children) {
+            if (child.id) {
+                old_el_by_id[child.id] = child;
+            }
+        }
+
+        let from_child = from_parent.firstChild;
+        let to_child = to_parent.firstChild;
+        while (to_child) {
+            const next_to_child = to_child.nextSibling;
+            let match = null;
+            if (to_child.nodeType === Node.ELEMENT_NODE && to_child.id && old_el_by_id[to_child.id]) {
+                match = old_el_by_id[to_child.id];
+                delete old_el_by_id[to_child.id];
+            } else if (from_child && _self._is_same_node_kind(from_child, to_child)) {
+                match = from_child;
+                delete old_el_by_id[match.id];
+            }
+
+            if (match) {
+                if (match !== from_child) {
+                    from_parent.insertBefore(match, from_child);  // keyed element moved into place
+                } else {
+                    from_child = from_child.nextSibling;
+                }
+                _self._morph_node(match, to_child);
+            } else {
+                from_parent.insertBefore(document.importNode(to_child, true), from_child);
+            }
+            to_child = next_to_child;
+        }
+
+        while (from_child) {
+            const next_from_child = from_child.nextSibling;
+            from_parent.removeChild(from_child);
+            from_child = next_from_child;
+        }
+    };
+
+    _self._morph_node = function(from_node, to_node) {
+        if (from_node.nodeType !== Node.ELEMENT_NODE) {
+            if (from_node.nodeValue !== to_node.nodeValue) {
+                from_node.nodeValue = to_node.nodeValue;
+            }
+            return;
+        }
+
+        for (const attr of Array.from(from_node.attributes)) {
+            if (!to_node.hasAttribute(attr.name)) {
+                from_node.removeAttribute(attr.name);
+            }
+        }
+        for (const attr of Array.from(to_node.attributes)) {
+            if (from_node.getAttribute(attr.name) !== attr.value) {
+                from_node.setAttribute(attr.name, attr.value);
+            }
+        }
+
+        // the value of an input the user is typing in is left alone
+        if (from_node !== document.activeElement) {
+            if (from_node.nodeName === 'INPUT') {
+                const value = to_node.getAttribute('value') || '';
+                if (from_node.value !== value) {
+                    from_node.value = value;
+                }
+                if (from_node.type === 'checkbox' || from_node.type === 'radio') {
+                    from_node.checked = to_node.hasAttribute('checked');
+                }
+            } else if (from_node.nodeName === 'TEXTAREA' && from_node.value !== to_node.textContent) {
+                from_node.value = to_node.textContent;
+            }
+        }
+
+        _self._morph_children(from_node, to_node);
+    };
+
     _self.active_plugins = [];
 
     _self.register_plugin_js = function(plugin_function_class) {
@@ -139,11 +682,57 @@ function PyWebEngineGui()
             }
         };
 
-        _self.active_plugins.push(plugin_name);
+        if (!_self.active_plugins.includes(plugin_name)) {
+            _self.active_plugins.push(plugin_name);  // (a hot reloaded plugin registers again)
+        }
 
         _self[plugin_name] = plugin_instance;
     };
 
+    // ----------------------------------------------------------------------------------------------
+    // Hot reload (watch_for_changes=True on the Python side) ... swaps a changed plugin component into
+    // the running page: CSS is replaced, JS is run again (re-registering and re-initializing the plugin)
+    // and the plugin's HTML block is morphed into the new HTML.
+    // ----------------------------------------------------------------------------------------------
+    _self._hot_reload_plugin_component = function(plugin_name, component, content) {
+        if (component === 'css') {
+            const style_el = document.getElementById('PWEG_' + plugin_name + '_css');
+            if (style_el) {
+                style_el.textContent = content;
+            }
+            return;
+        }
+
+        if (component === 'js') {
+            const old_script_el = document.getElementById('PWEG_' + plugin_name + '_js');
+            const script_el = document.createElement('script');
+            script_el.id = 'PWEG_' + plugin_name + '_js';
+            script_el.textContent = content;  // runs when added, which registers the plugin again
+            if (old_script_el) {
+                old_script_el.replaceWith(script_el);
+            } else {
+                document.body.appendChild(script_el);
+            }
+            if ('init' in _self[plugin_name]) {
+                _self[plugin_name].init();
+            }
+            return;
+        }
+
+        if (component === 'html') {
+            // elements reparented out of the block by auto_init() come back with the new HTML, so the
+            // old ones go
+            const block_el = document.getElementById('PWEG_' + plugin_name);
+            for (const reparented_el of document.querySelectorAll('[' + plugin_name + '-parent]')) {
+                if (block_el && !block_el.contains(reparented_el)) {
+                    reparented_el.remove();
+                }
+            }
+            _self.patch_html('PWEG_' + plugin_name, content);
+            _self[plugin_name].auto_init();
+        }
+    };
+
     _self.init_plugins = function() {
         for (let c=0; c < _self.active_plugins.length; c++) {
             let plugin_name = _self.active_plugins[c];
@@ -268,9 +268,10 @@ class Plugin(PluginBase):
 
     def _ui_update_progress_driver_fn(self, task_name, progress_msg, percent_complete):
 
-        self.call_plugin_js_op('ui_update_progress',
-                                  {'task_name': task_name, 'progress_msg': progress_msg,
-                                   'percent_complete': percent_complete})
+        # progress only needs the newest value, so conflate per task
+        self.call_plugin_js_op_conflated(task_name, 'ui_update_progress',
+                                         {'task_name': task_name, 'progress_msg': progress_msg,
+                                          'percent_complete': percent_complete})
 
     def _ui_task_ended_driver_fn(self, task_name, completion_status, completion_message):
 
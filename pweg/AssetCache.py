@@ -0,0 +1,305 @@
+# -------------------------------------------------------------------------------
+# MIT License
+#
+# Copyright (c) 2021 pxlc@github
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# -------------------------------------------------------------------------------
+import os
+import sys
+import hashlib
+import mimetypes
+import threading
+
+_PWEG_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__))).replace('\\', '/')
+sys.path.insert(0, '%s/thirdparty_packages' % _PWEG_ROOT)  # to include QtPy package
+
+from qtpy.QtCore import QBuffer, QFile, QIODevice, QUrl
+from qtpy.QtNetwork import QNetworkAccessManager, QNetworkReply, QNetworkRequest
+from qtpy.QtWebEngineWidgets import QWebEngineProfile
+
+from .UrlSchemeHandler import PWEG_URL_SCHEME, get_url_scheme_handler, QWebEngineUrlRequestInterceptor, \
+    QWebEngineUrlRequestInfo, QWebEngineUrlRequestJob
+from .util import write_file_atomically
+
+
+ASSET_CACHE_NAMESPACE = 'pweg-asset-cache'
+
+MIME_TYPE_BY_RESOURCE_TYPE = {
+    QWebEngineUrlRequestInfo.ResourceTypeScript: 'application/javascript',
+    QWebEngineUrlRequestInfo.ResourceTypeStylesheet: 'text/css',
+    QWebEngineUrlRequestInfo.ResourceTypeFontResource: None,  # guessed from the URL
+}
+
+
+# not known to mimetypes on every platform / Python version
+MIME_TYPE_BY_EXTENSION = {
+    '.woff2': 'font/woff2', '.woff': 'font/woff', '.ttf': 'font/ttf', '.otf': 'font/otf',
+    '.eot': 'application/vnd.ms-fontobject', '.svg': 'image/svg+xml', '.js': 'application/javascript',
+    '.css': 'text/css',
+}
+
+
+def guess_asset_mime_type(url_path):
+
+    extension = os.path.splitext(url_path)[1].lower()
+    return MIME_TYPE_BY_EXTENSION.get(extension) or mimetypes.guess_type(url_path)[0] or 'application/octet-stream'
+
+
+class AssetCache(object):
+    """
+    Local cache of external (http/https) scripts, stylesheets and fonts that pages load, e.g. from CDNs.
+    Each asset is fetched once and stored under the hash of its URL, later loads are served from disk
+    through "pweg://pweg-asset-cache/<scheme>/<host>/<path>" (stored as the hash of the URL). Assets are also
+    looked up in an optional pre-seeded directory (same file naming, see seed()), e.g. for machines without
+    network access.
+
+    With offline_only=True nothing is fetched ... assets missing from the cache and seed directory fail
+    right away instead of waiting on the network.
+    """
+
+    def __init__(self, cache_dirpath, seed_dirpath=None, offline_only=False):
+
+        self.cache_dirpath = cache_dirpath
+        self.seed_dirpath = seed_dirpath
+        self.offline_only = offline_only
+
+        self.lock = threading.Lock()
+        self.mime_type_by_key = {}  # url hash -> mime type, for assets whose resource type was intercepted
+        self.pending_job_list_by_key = {}
+        self.network_access_manager = None
+
+        self.stats = {'hits': 0, 'misses': 0, 'fetch_failures': 0, 'offline_blocked': 0}
+
+        if not os.path.isdir(self.cache_dirpath):
+            os.makedirs(self.cache_dirpath)
+
+    @staticmethod
+    def url_key(url_str):
+
+        return hashlib.sha1(url_str.encode('utf-8')).hexdigest()
+
+    def find_asset_filepath(self, key):
+
+        for dirpath in (self.cache_dirpath, self.seed_dirpath):
+            if dirpath and os.path.isfile('%s/%s' % (dirpath, key)):
+                return '%s/%s' % (dirpath, key)
+        return None
+
+    def _store_asset(self, key, data_bytes):
+
+        write_file_atomically('%s/%s' % (self.cache_dirpath, key), data_bytes)
+
+    def seed(self, url_str_list, timeout_secs=30):
+
+        # Fetches the given asset URLs into the cache directory (blocking, no Qt event loop needed) ... copy
+        # the cache directory to use it as the seed directory on machines without network access
+        try:
+            from urllib.request import urlopen
+        except ImportError:
+            from urllib2 import urlopen
+
+        failed_url_list = []
+        for url_str in url_str_list:
+            try:
+                self._store_asset(self.asset_key(QUrl(url_str)), urlopen(url_str, timeout=timeout_secs).read())
+            except Exception:
+                failed_url_list.append(url_str)
+        return failed_url_list
+
+    @staticmethod
+    def _canonical_url_str(scheme, authority, encoded_path, encoded_query):
+
+        # the original asset URL, as hashed for its storage name
+        url_str = '%s://%s%s' % (scheme, authority, encoded_path or '/')
+        return '%s?%s' % (url_str, encoded_query) if encoded_query else url_str
+
+    def asset_key(self, url):
+
+        # storage name of the asset at url (a QUrl)
+        return self.url_key(self._canonical_url_str(url.scheme(), url.authority(), url.path(QUrl.FullyEncoded),
+                                                    url.query(QUrl.FullyEncoded)))
+
+    def redirect_url_for(self, url, resource_type):
+
+        # Called by the interceptor ... returns the "pweg://" URL to load url (a QUrl) from, or None to block the
+        # request (offline and not cached). The cache URL keeps the origin and path of the asset, i.e.
+        #
+        #     https://cdn.host/lib/css/lib.css  ->  pweg://pweg-asset-cache/https/cdn.host/lib/css/lib.css
+        #
+        # so URLs relative to it (e.g. fonts referenced by a stylesheet) resolve into the asset cache too
+        encoded_path = url.path(QUrl.FullyEncoded) or '/'
+        encoded_query = url.query(QUrl.FullyEncoded)
+        key = self.asset_key(url)
+
+        with self.lock:
+            if MIME_TYPE_BY_RESOURCE_TYPE.get(resource_type):
+                self.mime_type_by_key[key] = MIME_TYPE_BY_RESOURCE_TYPE[resource_type]
+            if self.offline_only and not self.find_asset_filepath(key):
+                self.stats['offline_blocked'] += 1
+                return None
+
+        cache_url = QUrl()
+        cache_url.setScheme(PWEG_URL_SCHEME)
+        cache_url.setHost(ASSET_CACHE_NAMESPACE)
+        cache_url.setPath('/%s/%s%s' % (url.scheme(), url.authority(), encoded_path), QUrl.TolerantMode)
+        if encoded_query:
+            cache_url.setQuery(encoded_query, QUrl.TolerantMode)
+        return cache_url
+
+    def handle_request(self, job, url_path):
+
+        # scheme handler for the asset cache namespace (GUI thread) ... the original URL is rebuilt from the
+        # request URL (see redirect_url_for()), which can also be relative to another cached asset. url_path
+        # is decoded, so the path is read (encoded) from the job's URL instead.
+        request_url = job.requestUrl()
+        path_bits = request_url.path(QUrl.FullyEncoded).lstrip('/').split('/', 2)
+        if len(path_bits) < 3 or path_bits[0] not in ('http', 'https'):
+            job.fail(QWebEngineUrlRequestJob.UrlNotFound)
+            return
+
+        url_str = self._canonical_url_str(path_bits[0], path_bits[1], '/' + path_bits[2],
+                                          request_url.query(QUrl.FullyEncoded))
+        key = self.url_key(url_str)
+        mime_type = self.mime_type_by_key.get(key) or guess_asset_mime_type(path_bits[2])
+
+        asset_filepath = self.find_asset_filepath(key)
+        if asset_filepath:
+            with self.lock:
+                self.stats['hits'] += 1
+            device = QFile(asset_filepath, job)
+            if not device.open(QIODevice.ReadOnly):
+                job.fail(QWebEngineUrlRequestJob.RequestFailed)
+                return
+            job.reply(mime_type.encode('ascii'), device)
+            return
+
+        if self.offline_only:
+            job.fail(QWebEngineUrlRequestJob.UrlNotFound)
+            return
+
+        # not cached yet ... fetch it once, replying to every request for it that comes in meanwhile
+        job_id = id(job)
+        job.destroyed.connect(lambda *args: self._job_destroyed(key, job_id))
+        if key in self.pending_job_list_by_key:
+            self.pending_job_list_by_key[key].append((job_id, job))
+            return
+        self.pending_job_list_by_key[key] = [(job_id, job)]
+
+        with self.lock:
+            self.stats['misses'] += 1
+
+        if self.network_access_manager is None:
+            self.network_access_manager = QNetworkAccessManager()
+        request = QNetworkRequest(QUrl(url_str))
+        request.setAttribute(QNetworkRequest.FollowRedirectsAttribute, True)
+        reply = self.network_access_manager.get(request)
+        reply.finished.connect(lambda: self._asset_fetched(key, mime_type, reply))
+
+    def _job_destroyed(self, key, job_id):
+
+        # e.g. the page was closed before the asset arrived
+        job_list = self.pending_job_list_by_key.get(key)
+        if job_list:
+            job_list[:] = [(j_id, j) for (j_id, j) in job_list if j_id != job_id]
+
+    def _asset_fetched(self, key, mime_type, reply):
+
+        job_list = self.pending_job_list_by_key.pop(key, [])
+        reply.deleteLater()
+
+        if reply.error() != QNetworkReply.NoError:
+            with self.lock:
+                self.stats['fetch_failures'] += 1
+            for (job_id, job) in job_list:
+                job.fail(QWebEngineUrlRequestJob.RequestFailed)
+            return
+
+        data_bytes = bytes(reply.readAll())
+        try:
+            self._store_asset(key, data_bytes)
+        except (IOError, OSError):
+            pass  # still served this time, just fetched again next time
+
+        for (job_id, job) in job_list:
+            device = QBuffer(job)
+            device.setData(data_bytes)
+            device.open(QIODevice.ReadOnly)
+            job.reply(mime_type.encode('ascii'), device)
+
+    def get_stats(self):
+
+        with self.lock:
+            stats = dict(self.stats)
+        stats['offline_only'] = self.offline_only
+        return stats
+
+
+class AssetCacheInterceptor(QWebEngineUrlRequestInterceptor):
+
+    CACHED_RESOURCE_TYPES = tuple(MIME_TYPE_BY_RESOURCE_TYPE.keys())
+
+    def __init__(self, asset_cache, parent=None):
+
+        super(AssetCacheInterceptor, self).__init__(parent)
+        self.asset_cache = asset_cache
+
+    def interceptRequest(self, info):
+
+        url = info.requestUrl()
+        if url.scheme() not in ('http', 'https') or info.resourceType() not in self.CACHED_RESOURCE_TYPES:
+            return
+
+        redirect_url = self.asset_cache.redirect_url_for(url, info.resourceType())
+        if redirect_url is None:
+            info.block(True)
+            return
+        info.redirect(redirect_url)
+
+
+_asset_cache = None
+
+
+def get_asset_cache(cache_dirpath, seed_dirpath=None, offline_only=False, warning_fn=None):
+
+    # One cache for the process, installed on the default profile (which all dialogs use) the first time
+    # it's asked for. The PWEG_ASSET_CACHE_SEED_DIR and PWEG_ASSET_CACHE_OFFLINE_ONLY ("1") environment
+    # variables override the args, so e.g. render nodes can be set up without code changes. Later calls
+    # asking for other settings get the existing cache as is, reported through warning_fn(msg).
+    global _asset_cache
+
+    seed_dirpath = os.environ.get('PWEG_ASSET_CACHE_SEED_DIR') or seed_dirpath
+    offline_only = os.environ.get('PWEG_ASSET_CACHE_OFFLINE_ONLY', '1' if offline_only else '0') == '1'
+
+    if _asset_cache is not None:
+        if warning_fn and (seed_dirpath, offline_only) != (_asset_cache.seed_dirpath, _asset_cache.offline_only):
+            warning_fn('External asset cache is already set up (seed dir "%s", offline_only=%s), so seed dir '
+                       '"%s" and offline_only=%s are ignored' %
+                       (_asset_cache.seed_dirpath, _asset_cache.offline_only, seed_dirpath, offline_only))
+    else:
+        _asset_cache = AssetCache(cache_dirpath, seed_dirpath=seed_dirpath, offline_only=offline_only)
+        get_url_scheme_handler().set_namespace_request_handler(ASSET_CACHE_NAMESPACE, _asset_cache.handle_request)
+
+        _asset_cache.interceptor = AssetCacheInterceptor(_asset_cache)
+        profile = QWebEngineProfile.defaultProfile()
+        if hasattr(profile, 'setUrlRequestInterceptor'):
+            profile.setUrlRequestInterceptor(_asset_cache.interceptor)
+        else:
+            profile.setRequestInterceptor(_asset_cache.interceptor)  # Qt < 5.13
+    return _asset_cache
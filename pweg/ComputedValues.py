@@ -0,0 +1,179 @@
+# -------------------------------------------------------------------------------
+# MIT License
+#
+# Copyright (c) 2021 pxlc@github
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# -------------------------------------------------------------------------------
+import threading
+
+
+class ComputedValueGraph(object):
+    """
+    Memoized values derived from StateStore paths and from other computed values, e.g.
+
+        computed_values.define('shot_list', lambda shots: sorted(shots or {}), ['/shots'])
+        computed_values.define('shot_count', lambda shot_list: len(shot_list), ['shot_list'])
+
+    Inputs starting with "/" are state paths, anything else names another computed value. Values are
+    computed lazily (on get(), or at flush time for values the page subscribed to) and only recomputed
+    when an input changed ... a recomputed value equal to the previous one counts as unchanged, so its
+    dependents are not recomputed either.
+
+    The page subscribes with pweg.subscribe_computed(name, fn) and gets a "PWEG_computed_values" JS op
+    only when a subscribed value actually differs from what it last received.
+    """
+
+    def __init__(self, state_store, request_flush_fn=None):
+
+        self.lock = threading.RLock()
+        self.state_store = state_store
+        self.request_flush_fn = request_flush_fn
+        self.node_by_name = {}
+        self.subscribed_names = set()
+        self.sent_version_by_name = {}
+
+        self.stats = {'computes': 0, 'cache_hits': 0, 'values_sent': 0}
+
+        state_store.add_change_listener(self._state_changed)
+
+    def define(self, name, compute_fn, input_list):
+
+        # compute_fn is called with the current value of each input, in input_list order
+        if name.startswith('/'):
+            raise ValueError('Computed value name "%s" must not start with "/" (reserved for state paths)' % name)
+
+        with self.lock:
+            for input_name in input_list:
+                if not input_name.startswith('/') and input_name not in self.node_by_name:
+                    raise ValueError('Computed value "%s" has undefined input "%s"' % (name, input_name))
+            # a redefined value carries its version forward (bumped), so dependents computed from the old
+            # definition see a changed input
+            old_node = self.node_by_name.get(name)
+            self.node_by_name[name] = {
+                'compute_fn': compute_fn,
+                'input_list': list(input_list),
+                'state_version': 0,  # bumped when one of the state path inputs changes
+                'input_key': None,   # (state_version, input versions) the value was computed with
+                'value': None,
+                'version': old_node['version'] + 1 if old_node else 0,  # bumped when the value changes
+            }
+            self.sent_version_by_name.pop(name, None)
+
+    @staticmethod
+    def _is_related_path(path_a, path_b):
+
+        return (path_a == path_b or not path_a or not path_b or
+                path_a.startswith(path_b + '/') or path_b.startswith(path_a + '/'))
+
+    def _state_changed(self, changed_path_list):
+
+        is_input_changed = False
+        with self.lock:
+            for node in self.node_by_name.values():
+                for input_name in node['input_list']:
+                    if input_name.startswith('/') and \
+                            any(self._is_related_path(input_name, p) for p in changed_path_list):
+                        node['state_version'] += 1
+                        is_input_changed = True
+                        break
+            is_flush_needed = is_input_changed and bool(self.subscribed_names)
+
+        if is_flush_needed and self.request_flush_fn:
+            self.request_flush_fn()
+
+    def _update(self, name):
+
+        # brings the node (and its inputs) up to date, returns its version
+        node = self.node_by_name[name]
+        input_version_list = [node['state_version']]
+        for input_name in node['input_list']:
+            input_version_list.append(0 if input_name.startswith('/') else self._update(input_name))
+        input_key = tuple(input_version_list)
+
+        if input_key == node['input_key']:
+            self.stats['cache_hits'] += 1
+            return node['version']
+
+        input_value_list = [self.state_store.get(input_name) if input_name.startswith('/') else
+                            self.node_by_name[input_name]['value'] for input_name in node['input_list']]
+        value = node['compute_fn'](*input_value_list)
+        self.stats['computes'] += 1
+
+        is_first_compute = node['input_key'] is None
+        node['input_key'] = input_key
+        if is_first_compute or value != node['value']:
+            node['value'] = value
+            node['version'] += 1
+        return node['version']
+
+    def get(self, name):
+
+        with self.lock:
+            if name not in self.node_by_name:
+                raise KeyError('Unknown computed value "%s"' % name)
+            self._update(name)
+            return self.node_by_name[name]['value']
+
+    def subscribe(self, name):
+
+        # returns the current value, later changes are sent with the outbound flushes
+        with self.lock:
+            value = self.get(name)
+            self.subscribed_names.add(name)
+            self.sent_version_by_name[name] = self.node_by_name[name]['version']
+            return value
+
+    def unsubscribe(self, name):
+
+        with self.lock:
+            self.subscribed_names.discard(name)
+            self.sent_version_by_name.pop(name, None)
+
+    def clear_subscriptions(self):
+
+        # the page is (re)loading, its subscriptions are gone
+        with self.lock:
+            self.subscribed_names = set()
+            self.sent_version_by_name = {}
+
+    def take_changed_messages(self):
+
+        # outbound queue flush hook (GUI thread) ... recomputes subscribed values and returns the changed ones
+        with self.lock:
+            changed_value_by_name = {}
+            for name in sorted(self.subscribed_names):
+                version = self._update(name)
+                if version != self.sent_version_by_name.get(name):
+                    self.sent_version_by_name[name] = version
+                    changed_value_by_name[name] = self.node_by_name[name]['value']
+
+            if not changed_value_by_name:
+                return None
+            self.stats['values_sent'] += len(changed_value_by_name)
+
+        return [('PWEG_computed_values', changed_value_by_name)]
+
+    def get_stats(self):
+
+        with self.lock:
+            stats = dict(self.stats)
+            stats['defined'] = len(self.node_by_name)
+            stats['subscribed'] = len(self.subscribed_names)
+        return stats
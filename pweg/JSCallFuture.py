@@ -0,0 +1,114 @@
+# -------------------------------------------------------------------------------
+# MIT License
+#
+# Copyright (c) 2021 pxlc@github
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# -------------------------------------------------------------------------------
+
+
+import os
+import sys
+import threading
+
+_PWEG_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__))).replace('\\', '/')
+sys.path.insert(0, '%s/thirdparty_packages' % _PWEG_ROOT)  # to include QtPy package
+
+from qtpy.QtCore import QCoreApplication, QEventLoop, QThread, QTimer
+
+
+class JSCallTimeoutError(Exception):
+    pass
+
+
+class JSCallError(Exception):
+    pass
+
+
+class JSCallFuture(object):
+    """
+    Result of WebEngineDialogBase.run_js_async() / call_js_function(). result() can be waited on from any
+    thread ... on the GUI thread it runs a local event loop while waiting, so the page can still answer.
+    """
+    def __init__(self):
+
+        self._done_event = threading.Event()
+        self._lock = threading.Lock()
+        self._result = None
+        self._exception = None
+        self._done_callbacks = []
+
+    def _set_done(self, result=None, exception=None):
+
+        with self._lock:
+            if self._done_event.is_set():
+                return False  # e.g. the result arrived after the future already timed out
+            self._result = result
+            self._exception = exception
+            self._done_event.set()
+            done_callbacks = self._done_callbacks
+            self._done_callbacks = []
+
+        for done_callback in done_callbacks:
+            done_callback(self)
+        return True
+
+    def set_result(self, result):
+
+        return self._set_done(result=result)
+
+    def set_exception(self, exception):
+
+        return self._set_done(exception=exception)
+
+    def done(self):
+
+        return self._done_event.is_set()
+
+    def add_done_callback(self, done_callback):
+
+        # done_callback(future) is called on the GUI thread (or right away if already done)
+        with self._lock:
+            if not self._done_event.is_set():
+                self._done_callbacks.append(done_callback)
+                return
+        done_callback(self)
+
+    def _wait_on_gui_thread(self, timeout_secs):
+
+        event_loop = QEventLoop()
+        self.add_done_callback(lambda future: event_loop.quit())
+        if timeout_secs is not None:
+            QTimer.singleShot(int(timeout_secs * 1000), event_loop.quit)
+        if not self.done():
+            event_loop.exec_()
+
+    def result(self, timeout_secs=None):
+
+        app = QCoreApplication.instance()
+        if app and QThread.currentThread() == app.thread():
+            self._wait_on_gui_thread(timeout_secs)
+        else:
+            self._done_event.wait(timeout_secs)
+
+        if not self.done():
+            raise JSCallTimeoutError('JavaScript call did not complete within %s seconds' % timeout_secs)
+        if self._exception is not None:
+            raise self._exception
+        return self._result
@@ -0,0 +1,81 @@
+# -------------------------------------------------------------------------------
+# MIT License
+#
+# Copyright (c) 2021 pxlc@github
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# -------------------------------------------------------------------------------
+
+
+import json
+
+
+# --------------------------------------------------------------------------------------------------------
+#  Message codecs used for JS <-> Python op traffic. Both directions travel as text (QWebChannel string
+#  slot args and runJavaScript source), so every codec encodes to a JSON str, which pweg.js decodes with
+#  its matching JSON decoder.
+# --------------------------------------------------------------------------------------------------------
+
+class JsonMessageCodec(object):
+
+    name = 'json'
+
+    def encode(self, data):
+        return json.dumps(data)
+
+    def decode(self, data_str):
+        return json.loads(data_str)
+
+
+class OrjsonMessageCodec(object):
+
+    name = 'orjson'
+
+    def __init__(self):
+
+        import orjson
+        self.orjson = orjson
+        self.dumps_options = orjson.OPT_NON_STR_KEYS
+
+    def encode(self, data):
+        try:
+            return self.orjson.dumps(data, option=self.dumps_options).decode('utf-8')
+        except TypeError:
+            # orjson is stricter than json (e.g. ints beyond 64 bits), so fall back rather than fail the op
+            return json.dumps(data)
+
+    def decode(self, data_str):
+        return self.orjson.loads(data_str)
+
+
+MESSAGE_CODEC_CLASSES = [OrjsonMessageCodec, JsonMessageCodec]  # in order of preference
+
+
+def get_message_codec(codec_name=None):
+
+    # with no codec_name the fastest importable codec is used, falling back to the stdlib json codec
+    for codec_cls in MESSAGE_CODEC_CLASSES:
+        if codec_name and codec_cls.name != codec_name:
+            continue
+        try:
+            return codec_cls()
+        except ImportError:
+            if codec_name:
+                raise
+    raise ValueError('Unknown message codec "%s"' % codec_name)
@@ -0,0 +1,319 @@
+# -------------------------------------------------------------------------------
+# MIT License
+#
+# Copyright (c) 2021 pxlc@github
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# -------------------------------------------------------------------------------
+
+
+import os
+import sys
+import inspect
+import threading
+import traceback
+
+_PWEG_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__))).replace('\\', '/')
+sys.path.insert(0, '%s/thirdparty_packages' % _PWEG_ROOT)  # to include QtPy package
+
+from qtpy.QtCore import QObject, QRunnable, QThreadPool, QTimer, Signal, Slot
+
+
+class OpCancelToken(object):
+    """
+    Passed as the second argument to ops registered with cancellable=True. Long running ops should poll
+    is_cancelled() and return early once the JS caller has cancelled the call.
+    """
+    def __init__(self):
+
+        self._cancelled_event = threading.Event()
+
+    def cancel(self):
+
+        self._cancelled_event.set()
+
+    def is_cancelled(self):
+
+        return self._cancelled_event.is_set()
+
+
+def bind_cancel_token(op_fn, cancel_token):
+
+    def cancellable_op_fn(op_data):
+        return op_fn(op_data, cancel_token)
+
+    return cancellable_op_fn
+
+
+def _op_stream_error_result(op_name, chunk_count):
+
+    return {
+        'ret_status': 'ERROR', 'chunk_count': chunk_count,
+        'message': 'Exception occurred in streaming op "%s" - stack trace follows.\n\n%s' %
+                   (op_name, traceback.format_exc())
+    }
+
+
+def iterate_op_stream(request_id, op_name, op_stream, op_chunk_fn, cancel_token):
+
+    # delivers each chunk yielded by a generator op and returns the final op result
+    chunk_count = 0
+    try:
+        for chunk in op_stream:
+            if cancel_token.is_cancelled():
+                op_stream.close()
+                return {'ret_status': 'CANCELLED', 'chunk_count': chunk_count}
+            op_chunk_fn(request_id, op_name, chunk)
+            chunk_count += 1
+    except:
+        return _op_stream_error_result(op_name, chunk_count)
+    return {'ret_status': 'OK', 'chunk_count': chunk_count}
+
+
+class OpWorkerSignals(QObject):
+    """
+    Signals emitted from an OpWorker running on a pool thread.
+    """
+    op_completed = Signal(str, str, object)  # request id, op name, result data
+    op_chunk = Signal(str, str, object)  # request id, op name, chunk data (from generator ops)
+
+
+class OpWorker(QRunnable):
+
+    def __init__(self, request_id, op_name, op_fn, op_data, signals, cancel_token):
+
+        super(OpWorker, self).__init__()
+
+        self.request_id = request_id
+        self.op_name = op_name
+        self.op_fn = op_fn
+        self.op_data = op_data
+        self.signals = signals
+        self.cancel_token = cancel_token
+
+        # the executor keeps hold of the worker until it completes (so it can be taken back off the queue)
+        self.setAutoDelete(False)
+
+    @Slot()
+    def run(self):
+
+        if self.cancel_token.is_cancelled():
+            self.signals.op_completed.emit(self.request_id, self.op_name, {'ret_status': 'CANCELLED'})
+            return
+
+        try:
+            result_data = self.op_fn(self.op_data)
+        except:
+            result_data = {
+                'ret_status': 'ERROR',
+                'message': 'Exception occurred in background op "%s" - stack trace follows.\n\n%s' %
+                           (self.op_name, traceback.format_exc())
+            }
+
+        if inspect.isgenerator(result_data):
+            result_data = iterate_op_stream(self.request_id, self.op_name, result_data,
+                                            self.signals.op_chunk.emit, self.cancel_token)
+
+        self.signals.op_completed.emit(self.request_id, self.op_name, result_data)
+
+
+class OpExecutor(QObject):
+    """
+    Runs ops registered with background=True on a managed thread pool. The completion function is
+    always called on the thread that owns the OpExecutor (the GUI thread), with signature:
+
+        op_completion_fn(request_id, op_name, result_data)
+
+    Ops that return a generator stream their chunks through op_chunk_fn(request_id, op_name, chunk) before
+    completing with a {"ret_status": ..., "chunk_count": ...} result.
+
+    Submitting with a coalesce_key (ops registered with coalesce=True) shares one execution between all
+    requests with that key that arrive while it is in flight ... each of their request ids gets the result.
+    A streaming op stops taking on new requests once it has sent its first chunk.
+
+    Cancelled request ids never get chunks or a result. A cancelled op that hasn't started yet is taken
+    off the pool queue right away, a running one has its cancel token set.
+    """
+
+    DEFAULT_MAX_THREAD_COUNT = 16
+
+    def __init__(self, op_completion_fn, op_chunk_fn, max_thread_count=None, parent=None):
+
+        super(OpExecutor, self).__init__(parent)
+
+        self.op_completion_fn = op_completion_fn
+        self.op_chunk_fn = op_chunk_fn
+
+        self.threadpool = QThreadPool()
+        self.threadpool.setMaxThreadCount(max_thread_count or self.DEFAULT_MAX_THREAD_COUNT)
+
+        self.signals = OpWorkerSignals()
+        self.signals.op_completed.connect(self._op_completed)
+        self.signals.op_chunk.connect(self._op_chunk)
+
+        self.in_flight_count = 0
+        self.coalesced_count = 0
+        self.cancelled_count = 0
+
+        # keyed by the request id the op actually runs under (the first request id for coalesced ops)
+        self.worker_by_request_id = {}
+        self.cancel_token_by_request_id = {}
+
+        self.waiting_request_ids_by_coalesce_key = {}
+        self.coalesce_key_by_request_id = {}  # every waiting request id of coalesced ops
+        self.cancelled_request_ids = set()
+
+    def submit(self, request_id, op_name, op_fn, op_data, coalesce_key=None, cancel_token=None, priority=1):
+
+        if coalesce_key is not None:
+            self.coalesce_key_by_request_id[request_id] = coalesce_key
+            if coalesce_key in self.waiting_request_ids_by_coalesce_key:
+                self.waiting_request_ids_by_coalesce_key[coalesce_key].append(request_id)
+                self.coalesced_count += 1
+                return
+            self.waiting_request_ids_by_coalesce_key[coalesce_key] = [request_id]
+
+        cancel_token = cancel_token or OpCancelToken()
+        worker = OpWorker(request_id, op_name, op_fn, op_data, self.signals, cancel_token)
+
+        self.in_flight_count += 1
+        self.worker_by_request_id[request_id] = worker
+        self.cancel_token_by_request_id[request_id] = cancel_token
+        self.threadpool.start(worker, priority)
+
+    def deliver_result(self, request_id, op_name, result_data):
+
+        # for results of ops run outside the pool after their web channel call had already returned
+        self.op_completion_fn(request_id, op_name, result_data)
+
+    def stream_on_gui_thread(self, request_id, op_name, op_stream):
+
+        # generator returned by an op that runs on the GUI thread ... pull one chunk per event loop pass so
+        # the UI keeps processing events while the stream is delivered
+        self.in_flight_count += 1
+        cancel_token = OpCancelToken()
+        self.cancel_token_by_request_id[request_id] = cancel_token
+        chunk_state = {'chunk_count': 0}
+
+        def _pull_next_chunk():
+            if cancel_token.is_cancelled():
+                op_stream.close()
+                self._op_completed(request_id, op_name,
+                                   {'ret_status': 'CANCELLED', 'chunk_count': chunk_state['chunk_count']})
+                return
+            try:
+                chunk = next(op_stream)
+            except StopIteration:
+                self._op_completed(request_id, op_name,
+                                   {'ret_status': 'OK', 'chunk_count': chunk_state['chunk_count']})
+                return
+            except:
+                self._op_completed(request_id, op_name,
+                                   _op_stream_error_result(op_name, chunk_state['chunk_count']))
+                return
+            chunk_state['chunk_count'] += 1
+            self._op_chunk(request_id, op_name, chunk)
+            QTimer.singleShot(0, _pull_next_chunk)
+
+        QTimer.singleShot(0, _pull_next_chunk)
+
+    def cancel(self, request_id):
+
+        if request_id in self.cancelled_request_ids:
+            return
+        self.cancelled_request_ids.add(request_id)
+        self.cancelled_count += 1
+
+        run_request_id = request_id
+        if request_id in self.coalesce_key_by_request_id:
+            coalesce_key = self.coalesce_key_by_request_id[request_id]
+            waiting_request_ids = self.waiting_request_ids_by_coalesce_key[coalesce_key]
+            if [r for r in waiting_request_ids if r not in self.cancelled_request_ids]:
+                return  # other callers still want the result
+
+            # every caller has cancelled, so detach the group ... a new request with the same key then
+            # starts a fresh execution instead of joining the cancelled one
+            run_request_id = waiting_request_ids[0]
+            del self.waiting_request_ids_by_coalesce_key[coalesce_key]
+            for waiting_request_id in waiting_request_ids:
+                del self.coalesce_key_by_request_id[waiting_request_id]
+                if waiting_request_id != run_request_id:
+                    self.cancelled_request_ids.discard(waiting_request_id)
+
+        if run_request_id not in self.cancel_token_by_request_id:
+            # not (or no longer) in flight
+            self.cancelled_request_ids.discard(run_request_id)
+            return
+
+        self.cancel_token_by_request_id[run_request_id].cancel()
+
+        worker = self.worker_by_request_id.get(run_request_id)
+        if worker and hasattr(self.threadpool, 'tryTake') and self.threadpool.tryTake(worker):
+            # never started, so free its place in the queue now
+            self._op_completed(run_request_id, worker.op_name, {'ret_status': 'CANCELLED'})
+
+    def _get_waiting_request_ids(self, request_id):
+
+        if request_id in self.coalesce_key_by_request_id:
+            return self.waiting_request_ids_by_coalesce_key[self.coalesce_key_by_request_id[request_id]]
+        return [request_id]
+
+    def _close_coalesce_group(self, request_id):
+
+        # once a coalesced op has streamed chunks, a request that joined now would miss the earlier ones ...
+        # re-key the group under its run request id so new requests with the same key start a fresh run
+        coalesce_key = self.coalesce_key_by_request_id.get(request_id)
+        if coalesce_key is None or coalesce_key == ('__streaming__', request_id):
+            return
+        waiting_request_ids = self.waiting_request_ids_by_coalesce_key.pop(coalesce_key)
+        streaming_key = ('__streaming__', request_id)
+        self.waiting_request_ids_by_coalesce_key[streaming_key] = waiting_request_ids
+        for waiting_request_id in waiting_request_ids:
+            self.coalesce_key_by_request_id[waiting_request_id] = streaming_key
+
+    @Slot(str, str, object)
+    def _op_chunk(self, request_id, op_name, chunk):
+
+        self._close_coalesce_group(request_id)
+        for waiting_request_id in self._get_waiting_request_ids(request_id):
+            if waiting_request_id not in self.cancelled_request_ids:
+                self.op_chunk_fn(waiting_request_id, op_name, chunk)
+
+    @Slot(str, str, object)
+    def _op_completed(self, request_id, op_name, result_data):
+
+        self.in_flight_count -= 1
+        self.worker_by_request_id.pop(request_id, None)
+        self.cancel_token_by_request_id.pop(request_id, None)
+
+        request_id_list = [request_id]
+        if request_id in self.coalesce_key_by_request_id:
+            request_id_list = self.waiting_request_ids_by_coalesce_key.pop(self.coalesce_key_by_request_id[request_id])
+            for waiting_request_id in request_id_list:
+                del self.coalesce_key_by_request_id[waiting_request_id]
+
+        for waiting_request_id in request_id_list:
+            if waiting_request_id in self.cancelled_request_ids:
+                self.cancelled_request_ids.discard(waiting_request_id)
+                continue
+            self.op_completion_fn(waiting_request_id, op_name, result_data)
+
+    def wait_for_done(self, msecs=-1):
+
+        return self.threadpool.waitForDone(msecs)
@@ -0,0 +1,130 @@
+# -------------------------------------------------------------------------------
+# MIT License
+#
+# Copyright (c) 2021 pxlc@github
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# -------------------------------------------------------------------------------
+
+
+import time
+import bisect
+import threading
+
+perf_timer = getattr(time, 'perf_counter', time.time)
+
+
+class FixedHistogram(object):
+
+    def __init__(self, bucket_bounds):
+
+        self.bucket_bounds = bucket_bounds
+        self.bucket_counts = [0] * (len(bucket_bounds) + 1)  # last bucket is for values above the last bound
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+
+        self.bucket_counts[bisect.bisect_left(self.bucket_bounds, value)] += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def to_dict(self):
+
+        return {'buckets': list(self.bucket_counts), 'total': self.total, 'max': self.max}
+
+
+class OpMetrics(object):
+    """
+    Per op call counts, latency histograms (by phase, e.g. decode / execute / encode) and message size
+    histograms, for both directions:
+
+        "to_python"  ... ops called from JS (plus "__batch__" for the decode/encode of batched calls)
+        "to_js"      ... JS ops called from Python through call_js_op()
+
+    Everything is kept in fixed size bucket arrays, so memory use doesn't grow with the number of calls.
+    """
+
+    LATENCY_BUCKET_BOUNDS_MS = [0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 50.0, 100.0, 250.0, 500.0,
+                                1000.0, 2500.0, 10000.0]
+    SIZE_BUCKET_BOUNDS = [64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304]
+
+    def __init__(self):
+
+        self.lock = threading.Lock()
+        self.metrics_by_direction = {'to_python': {}, 'to_js': {}}
+
+    def _op_metrics(self, direction, op_name):
+
+        metrics_by_op = self.metrics_by_direction[direction]
+        if op_name not in metrics_by_op:
+            metrics_by_op[op_name] = {
+                'count': 0,
+                'latency_ms': {},
+                'request_size': FixedHistogram(self.SIZE_BUCKET_BOUNDS),
+                'response_size': FixedHistogram(self.SIZE_BUCKET_BOUNDS),
+            }
+        return metrics_by_op[op_name]
+
+    def record(self, direction, op_name, phase_secs_d, request_size=None, response_size=None, count=1):
+
+        with self.lock:
+            op_metrics = self._op_metrics(direction, op_name)
+            op_metrics['count'] += count
+
+            for (phase, secs) in phase_secs_d.items():
+                if phase not in op_metrics['latency_ms']:
+                    op_metrics['latency_ms'][phase] = FixedHistogram(self.LATENCY_BUCKET_BOUNDS_MS)
+                op_metrics['latency_ms'][phase].add(secs * 1000.0)
+
+            if request_size is not None:
+                op_metrics['request_size'].add(request_size)
+            if response_size is not None:
+                op_metrics['response_size'].add(response_size)
+
+    def timed_op_fn(self, op_name, op_fn, phase='background'):
+
+        # wraps an op function run off the GUI thread so its run time is recorded as its own phase
+        def _timed_op_fn(op_data):
+            start_time = perf_timer()
+            try:
+                return op_fn(op_data)
+            finally:
+                self.record('to_python', op_name, {phase: perf_timer() - start_time}, count=0)
+
+        return _timed_op_fn
+
+    def get_stats(self):
+
+        with self.lock:
+            stats = {
+                'latency_bucket_bounds_ms': self.LATENCY_BUCKET_BOUNDS_MS,
+                'size_bucket_bounds': self.SIZE_BUCKET_BOUNDS,
+            }
+            for (direction, metrics_by_op) in self.metrics_by_direction.items():
+                stats[direction] = {}
+                for (op_name, op_metrics) in metrics_by_op.items():
+                    stats[direction][op_name] = {
+                        'count': op_metrics['count'],
+                        'latency_ms': dict([(phase, h.to_dict()) for (phase, h) in op_metrics['latency_ms'].items()]),
+                        'request_size': op_metrics['request_size'].to_dict(),
+                        'response_size': op_metrics['response_size'].to_dict(),
+                    }
+            return stats
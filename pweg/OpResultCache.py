@@ -0,0 +1,139 @@
+# -------------------------------------------------------------------------------
+# MIT License
+#
+# Copyright (c) 2021 pxlc@github
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# -------------------------------------------------------------------------------
+
+
+import json
+import time
+import inspect
+import hashlib
+import threading
+import collections
+
+
+class OpResultCache(object):
+    """
+    Memoized op results for ops registered with the "cache" option, e.g.
+
+        @register_op(cache=True)                             # default size and no expiry
+        @register_op(cache={'max_size': 32, 'ttl': 60.0})    # at most 32 entries, each valid for 60 seconds
+
+    Results are keyed per op by a hash of the canonical JSON of op_data and evicted least recently used
+    first. Access is locked since background ops store their results from pool threads.
+    """
+
+    DEFAULT_MAX_SIZE = 128
+
+    def __init__(self):
+
+        self.lock = threading.Lock()
+        self.entries_by_op = {}  # op name -> OrderedDict of cache key -> (expiry time, op_data, result)
+        self.stats_by_op = {}
+
+    @staticmethod
+    def make_key(op_data):
+
+        canonical_str = json.dumps(op_data, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha1(canonical_str.encode('utf-8')).hexdigest()
+
+    def _op_stats(self, op_name):
+
+        if op_name not in self.stats_by_op:
+            self.stats_by_op[op_name] = {'hits': 0, 'misses': 0, 'evictions': 0}
+        return self.stats_by_op[op_name]
+
+    def lookup(self, op_name, cache_key):
+
+        # returns (is_hit, result)
+        with self.lock:
+            entries = self.entries_by_op.get(op_name)
+            entry = entries.get(cache_key) if entries else None
+
+            if entry and (entry[0] is None or entry[0] > time.time()):
+                entries[cache_key] = entries.pop(cache_key)  # now most recently used
+                self._op_stats(op_name)['hits'] += 1
+                return (True, entry[2])
+
+            if entry:
+                del entries[cache_key]  # expired
+            self._op_stats(op_name)['misses'] += 1
+            return (False, None)
+
+    def store(self, op_name, cache_key, op_data, result, cache_options):
+
+        max_size = cache_options.get('max_size') or self.DEFAULT_MAX_SIZE
+        ttl = cache_options.get('ttl')
+        expiry_time = time.time() + ttl if ttl else None
+
+        with self.lock:
+            entries = self.entries_by_op.setdefault(op_name, collections.OrderedDict())
+            entries.pop(cache_key, None)
+            entries[cache_key] = (expiry_time, op_data, result)
+
+            while len(entries) > max_size:
+                entries.popitem(last=False)
+                self._op_stats(op_name)['evictions'] += 1
+
+    def wrap_op_fn(self, op_name, cache_key, op_fn, cache_options, cancel_token=None):
+
+        # returns an op function that stores the result on completion (used for ops run off the GUI thread)
+        def caching_op_fn(op_data):
+            result = op_fn(op_data)
+            if cancel_token is not None and cancel_token.is_cancelled():
+                return result  # a cancelled run may have returned early with a partial result
+            if not inspect.isgenerator(result):  # streamed results are not memoized
+                self.store(op_name, cache_key, op_data, result, cache_options)
+            return result
+
+        return caching_op_fn
+
+    def invalidate(self, op_name=None, key_predicate=None):
+
+        # With no args everything is invalidated. key_predicate(op_name, op_data) returns True for each
+        # entry to drop. Returns the number of entries dropped.
+        dropped_count = 0
+
+        with self.lock:
+            op_name_list = [op_name] if op_name else list(self.entries_by_op.keys())
+            for name in op_name_list:
+                entries = self.entries_by_op.get(name)
+                if not entries:
+                    continue
+                if key_predicate is None:
+                    dropped_count += len(entries)
+                    entries.clear()
+                    continue
+                for cache_key in [k for (k, e) in entries.items() if key_predicate(name, e[1])]:
+                    del entries[cache_key]
+                    dropped_count += 1
+
+        return dropped_count
+
+    def get_stats(self):
+
+        with self.lock:
+            stats = {}
+            for (op_name, op_stats) in self.stats_by_op.items():
+                stats[op_name] = dict(op_stats)
+                stats[op_name]['size'] = len(self.entries_by_op.get(op_name, {}))
+            return stats
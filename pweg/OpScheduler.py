@@ -0,0 +1,138 @@
+# -------------------------------------------------------------------------------
+# MIT License
+#
+# Copyright (c) 2021 pxlc@github
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# -------------------------------------------------------------------------------
+
+
+import os
+import sys
+import time
+import collections
+
+_PWEG_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__))).replace('\\', '/')
+sys.path.insert(0, '%s/thirdparty_packages' % _PWEG_ROOT)  # to include QtPy package
+
+from qtpy.QtCore import QObject, QTimer
+
+
+class OpPriorities(object):
+
+    INTERACTIVE = 'interactive'
+    NORMAL = 'normal'
+    BULK = 'bulk'
+
+    # QThreadPool start priority for background ops in each lane (higher runs first)
+    THREADPOOL_PRIORITY = {INTERACTIVE: 2, NORMAL: 1, BULK: 0}
+
+
+class OpScheduler(QObject):
+    """
+    Sits in front of op execution for ops registered with priority=OpPriorities.BULK. Rather than running
+    when their web channel call arrives, bulk ops are queued and dispatched from a timer on the GUI thread
+    at no more than bulk_ops_per_sec, so interactive calls arriving in between are served first. When the
+    queue is full the oldest queued op is shed (its caller gets a {"ret_status": "SHED"} result), unless
+    bulk_overflow is "queue".
+
+    Interactive and normal ops are never queued here ... their lane only sets their thread pool priority
+    when they run in the background.
+    """
+
+    OVERFLOW_SHED = 'shed'
+    OVERFLOW_QUEUE = 'queue'
+
+    TICK_MSECS = 10
+
+    def __init__(self, op_shed_fn, bulk_ops_per_sec=100, bulk_max_queue_depth=500, bulk_overflow='shed',
+                 parent=None):
+
+        super(OpScheduler, self).__init__(parent)
+
+        # op_shed_fn(request_id, op_name) is called for each op dropped from a full queue
+        self.op_shed_fn = op_shed_fn
+
+        self.bulk_ops_per_sec = float(bulk_ops_per_sec)
+        self.bulk_max_queue_depth = bulk_max_queue_depth
+        self.bulk_overflow = bulk_overflow
+
+        self.bulk_queue = collections.deque()  # of (request_id, op_name, dispatch_fn)
+        self.tokens = 1.0
+        self.last_tick_time = time.time()
+
+        self.stats = {'enqueued': 0, 'dispatched': 0, 'shed': 0, 'cancelled': 0, 'max_queue_depth': 0}
+
+        self.drain_timer = QTimer(self)
+        self.drain_timer.setInterval(self.TICK_MSECS)
+        self.drain_timer.timeout.connect(self._drain)
+
+    @staticmethod
+    def is_queued_lane(priority):
+
+        return priority == OpPriorities.BULK
+
+    def enqueue(self, request_id, op_name, dispatch_fn):
+
+        if self.bulk_overflow == self.OVERFLOW_SHED and len(self.bulk_queue) >= self.bulk_max_queue_depth:
+            (shed_request_id, shed_op_name, _) = self.bulk_queue.popleft()
+            self.stats['shed'] += 1
+            self.op_shed_fn(shed_request_id, shed_op_name)
+
+        self.bulk_queue.append((request_id, op_name, dispatch_fn))
+        self.stats['enqueued'] += 1
+        self.stats['max_queue_depth'] = max(self.stats['max_queue_depth'], len(self.bulk_queue))
+
+        if not self.drain_timer.isActive():
+            self.last_tick_time = time.time()
+            self.drain_timer.start()
+
+    def cancel(self, request_id):
+
+        # returns True if the request was still queued (and is now dropped)
+        for queued in self.bulk_queue:
+            if queued[0] == request_id:
+                self.bulk_queue.remove(queued)
+                self.stats['cancelled'] += 1
+                return True
+        return False
+
+    def _drain(self):
+
+        now = time.time()
+        burst_size = max(1.0, self.bulk_ops_per_sec * self.TICK_MSECS / 1000.0)
+        self.tokens = min(burst_size, self.tokens + (now - self.last_tick_time) * self.bulk_ops_per_sec)
+        self.last_tick_time = now
+
+        while self.bulk_queue and self.tokens >= 1.0:
+            (request_id, op_name, dispatch_fn) = self.bulk_queue.popleft()
+            self.tokens -= 1.0
+            self.stats['dispatched'] += 1
+            dispatch_fn()
+
+        if not self.bulk_queue:
+            self.drain_timer.stop()
+
+    def get_stats(self):
+
+        stats = dict(self.stats)
+        stats['queue_depth'] = len(self.bulk_queue)
+        stats['bulk_ops_per_sec'] = self.bulk_ops_per_sec
+        stats['bulk_max_queue_depth'] = self.bulk_max_queue_depth
+        return stats
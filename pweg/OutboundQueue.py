@@ -0,0 +1,203 @@
+# -------------------------------------------------------------------------------
+# MIT License
+#
+# Copyright (c) 2021 pxlc@github
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# -------------------------------------------------------------------------------
+
+
+import os
+import sys
+import json
+import time
+import traceback
+import threading
+
+_PWEG_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__))).replace('\\', '/')
+sys.path.insert(0, '%s/thirdparty_packages' % _PWEG_ROOT)  # to include QtPy package
+
+from qtpy.QtCore import QObject, QTimer, Signal, Slot
+
+
+class OutboundMessageQueue(QObject):
+    """
+    Python -> JS op messages, put from any thread and delivered from the GUI thread in batches, at most
+    once per frame interval. Op data arrives here already encoded (on the calling thread), so a flush only
+    joins the pending messages into one batch string, which is passed to:
+
+        deliver_batch_fn(batch_str)   # batch_str is an encoded list of [js_op_name, js_op_data] pairs
+
+    Conflated messages (put_conflated()) are latest-wins per key: a newer message with the same key
+    replaces one still pending, and moves to the newest position in the queue. These are only encoded
+    (with encode_fn) at flush time, so superseded values cost nothing beyond the put.
+
+    Flush hooks (add_flush_hook()) are called at the start of each flush and return a list of
+    (js_op_name, js_op_data) messages (or None) to send at the front of the batch ... used by senders that
+    keep their own pending state, e.g. the StateStore patches. Such senders call request_flush() instead
+    of putting messages.
+
+    Until set_ready(True) is called (when the page's web channel has connected) messages are held in
+    order and delivered with the first flush after that.
+    """
+
+    flush_requested = Signal()
+
+    def __init__(self, deliver_batch_fn, encode_fn, frame_interval_msecs=16, error_fn=None, parent=None):
+
+        super(OutboundMessageQueue, self).__init__(parent)
+
+        self.deliver_batch_fn = deliver_batch_fn
+        self.encode_fn = encode_fn
+        self.error_fn = error_fn  # error_fn(msg), for failing flush hooks and encodes (printed if not given)
+        self.frame_interval_msecs = frame_interval_msecs
+
+        self.lock = threading.Lock()
+        self.pending_messages = []  # encoded message str, (js_op_name, js_op_data) if conflated, or None
+        self.conflated_index_by_key = {}
+        self.flush_is_requested = False
+        self.last_flush_time = 0.0
+        self.is_ready = False
+        self.flush_hook_list = []
+
+        self.stats = {'messages': 0, 'batches': 0, 'max_batch_size': 0, 'conflated': 0, 'flush_hook_errors': 0,
+                      'encode_errors': 0}
+
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.timeout.connect(self.flush)
+
+        # queued when put() is called off the GUI thread
+        self.flush_requested.connect(self._schedule_flush)
+
+    def put(self, js_op_name, js_op_data_str):
+
+        with self.lock:
+            self.pending_messages.append('[%s,%s]' % (json.dumps(js_op_name), js_op_data_str))
+            if self.flush_is_requested:
+                return
+            self.flush_is_requested = True
+
+        self.flush_requested.emit()
+
+    def add_flush_hook(self, flush_hook_fn):
+
+        self.flush_hook_list.append(flush_hook_fn)
+
+    def request_flush(self):
+
+        with self.lock:
+            if self.flush_is_requested:
+                return
+            self.flush_is_requested = True
+
+        self.flush_requested.emit()
+
+    def put_conflated(self, conflation_key, js_op_name, js_op_data):
+
+        # NOTE: js_op_data is encoded at flush time, so callers must not modify it after this call
+        with self.lock:
+            if conflation_key in self.conflated_index_by_key:
+                self.pending_messages[self.conflated_index_by_key[conflation_key]] = None
+                self.stats['conflated'] += 1
+            self.conflated_index_by_key[conflation_key] = len(self.pending_messages)
+            self.pending_messages.append((js_op_name, js_op_data))
+            if self.flush_is_requested:
+                return
+            self.flush_is_requested = True
+
+        self.flush_requested.emit()
+
+    @Slot()
+    def _schedule_flush(self):
+
+        if self.flush_timer.isActive():
+            return
+        msecs_since_flush = (time.time() - self.last_flush_time) * 1000.0
+        self.flush_timer.start(int(max(0.0, self.frame_interval_msecs - msecs_since_flush)))
+
+    def set_ready(self, is_ready):
+
+        # GUI thread only
+        self.is_ready = is_ready
+        if is_ready:
+            self.flush()
+
+    @Slot()
+    def flush(self):
+
+        # GUI thread only
+        if not self.is_ready:
+            return  # held until set_ready(True)
+
+        # a failing hook (e.g. a computed value whose compute function raises) is skipped, so it can't take
+        # the messages queued with it down too
+        message_list = []
+        for flush_hook_fn in self.flush_hook_list:
+            try:
+                for (js_op_name, js_op_data) in (flush_hook_fn() or []):
+                    message_list.append('[%s,%s]' % (json.dumps(js_op_name), self.encode_fn(js_op_data)))
+            except Exception:
+                self.stats['flush_hook_errors'] += 1
+                self._report_error('JS op flush hook %r failed:\n%s' % (flush_hook_fn, traceback.format_exc()))
+
+        with self.lock:
+            pending_messages = self.pending_messages
+            self.pending_messages = []
+            self.conflated_index_by_key = {}
+            self.flush_is_requested = False
+
+        self.last_flush_time = time.time()
+
+        for message in pending_messages:
+            if message is None:
+                continue  # superseded conflated message
+            if isinstance(message, tuple):
+                # conflated op data is only encoded now, so one that can't be is dropped on its own
+                try:
+                    message = '[%s,%s]' % (json.dumps(message[0]), self.encode_fn(message[1]))
+                except (TypeError, ValueError):
+                    self.stats['encode_errors'] += 1
+                    self._report_error('Op data of conflated JS op "%s" could not be encoded:\n%s' %
+                                       (message[0], traceback.format_exc()))
+                    continue
+            message_list.append(message)
+
+        if not message_list:
+            return
+
+        self.stats['messages'] += len(message_list)
+        self.stats['batches'] += 1
+        self.stats['max_batch_size'] = max(self.stats['max_batch_size'], len(message_list))
+
+        self.deliver_batch_fn('[%s]' % ','.join(message_list))
+
+    def _report_error(self, error_msg):
+
+        if self.error_fn:
+            self.error_fn(error_msg)
+        else:
+            print(error_msg)
+
+    def get_stats(self):
+
+        with self.lock:
+            stats = dict(self.stats)
+            stats['pending'] = len([m for m in self.pending_messages if m is not None])
+        return stats
@@ -0,0 +1,192 @@
+# -------------------------------------------------------------------------------
+# MIT License
+#
+# Copyright (c) 2021 pxlc@github
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# -------------------------------------------------------------------------------
+import os
+import json
+import hashlib
+import threading
+import collections
+
+import jinja2
+import jinja2.meta
+
+from .util import write_file_atomically
+
+
+class PageCache(object):
+    """
+    Fully assembled pages (rendered template plus plugin markup), kept in memory and on disk so a warm
+    start skips template rendering and plugin assembly. Entries are keyed by a hash of everything the page
+    depends on (see make_key()), so a changed input simply misses ... stale entries are never served,
+    the oldest ones are pruned once there are more than max_entries on disk. Template vars must not hold
+    per-session values (session paths, timestamps), otherwise every launch misses ... dialogs opt out with
+    is_page_cacheable().
+    """
+
+    DEFAULT_MAX_ENTRIES = 64
+
+    def __init__(self, cache_dirpath, max_entries=None):
+
+        self.cache_dirpath = cache_dirpath
+        self.max_entries = max_entries or self.DEFAULT_MAX_ENTRIES
+
+        self.lock = threading.Lock()
+        self.disk_lock = threading.Lock()  # one disk write/prune at a time
+        self.html_by_key = collections.OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0}
+
+    @staticmethod
+    def make_key(template_filepath, template_vars, plugin_key_info=None, j2_env=None):
+
+        # The templates the page template includes, imports or extends (recursively, loaded through j2_env)
+        # are part of the key too. Returns None when the page can't be keyed, e.g. when a template name is
+        # only known at render time, in which case the page is not cached.
+        with open(template_filepath, 'rb') as fp:
+            template_source = fp.read()
+
+        key_hash = hashlib.sha1(template_source)
+
+        if j2_env is not None:
+            source_by_template_name = PageCache._get_referenced_template_sources(j2_env,
+                                                                                 template_source.decode('utf-8'))
+            if source_by_template_name is None:
+                return None
+            for template_name in sorted(source_by_template_name):
+                key_hash.update(template_name.encode('utf-8'))
+                key_hash.update(source_by_template_name[template_name].encode('utf-8'))
+
+        key_str = json.dumps([os.path.abspath(template_filepath), template_vars, plugin_key_info or []],
+                             sort_keys=True, default=str)
+        key_hash.update(key_str.encode('utf-8'))
+        return key_hash.hexdigest()
+
+    @staticmethod
+    def _get_referenced_template_sources(j2_env, template_source):
+
+        source_by_template_name = {}
+        pending_source_list = [template_source]
+
+        while pending_source_list:
+            try:
+                template_name_list = list(jinja2.meta.find_referenced_templates(
+                    j2_env.parse(pending_source_list.pop())))
+            except jinja2.TemplateSyntaxError:
+                return None
+            for template_name in template_name_list:
+                if template_name is None:
+                    return None  # dynamic include/extends
+                if template_name in source_by_template_name:
+                    continue
+                try:
+                    (source, _, _) = j2_env.loader.get_source(j2_env, template_name)
+                except jinja2.TemplateNotFound:
+                    return None
+                source_by_template_name[template_name] = source
+                pending_source_list.append(source)
+
+        return source_by_template_name
+
+    def _entry_filepath(self, cache_key):
+
+        return '%s/%s.html' % (self.cache_dirpath, cache_key)
+
+    def lookup(self, cache_key):
+
+        with self.lock:
+            html_str = self.html_by_key.get(cache_key)
+
+        if html_str is None:
+            try:
+                with open(self._entry_filepath(cache_key), 'rb') as fp:
+                    html_str = fp.read().decode('utf-8')
+            except (IOError, OSError):
+                pass
+
+        with self.lock:
+            if html_str is None:
+                self.stats['misses'] += 1
+                return None
+            self.stats['hits'] += 1
+            self._keep_in_memory(cache_key, html_str)
+        return html_str
+
+    def _keep_in_memory(self, cache_key, html_str):
+
+        self.html_by_key.pop(cache_key, None)
+        self.html_by_key[cache_key] = html_str
+        while len(self.html_by_key) > self.max_entries:
+            self.html_by_key.popitem(last=False)
+
+    def store(self, cache_key, html_str):
+
+        with self.lock:
+            self._keep_in_memory(cache_key, html_str)
+            self.stats['stores'] += 1
+
+        # the disk write (and prune) happens on a worker thread, so a slow cache dir (e.g. on NFS) never
+        # holds up the page load
+        write_thread = threading.Thread(target=self._write_entry, args=(cache_key, html_str))
+        write_thread.daemon = True
+        write_thread.start()
+
+    def _write_entry(self, cache_key, html_str):
+
+        with self.disk_lock:
+            try:
+                if not os.path.isdir(self.cache_dirpath):
+                    os.makedirs(self.cache_dirpath)
+
+                write_file_atomically(self._entry_filepath(cache_key), html_str.encode('utf-8'))
+
+                self._prune()
+            except (IOError, OSError):
+                pass  # the page is then only cached in memory
+
+    def _prune(self):
+
+        entry_filepath_list = ['%s/%s' % (self.cache_dirpath, f) for f in os.listdir(self.cache_dirpath)
+                               if f.endswith('.html')]
+        if len(entry_filepath_list) <= self.max_entries:
+            return
+        entry_filepath_list.sort(key=os.path.getmtime)
+        for entry_filepath in entry_filepath_list[:len(entry_filepath_list) - self.max_entries]:
+            os.remove(entry_filepath)
+
+    def get_stats(self):
+
+        with self.lock:
+            stats = dict(self.stats)
+            stats['in_memory'] = len(self.html_by_key)
+        return stats
+
+
+_page_cache = None
+
+
+def get_page_cache(cache_dirpath):
+
+    global _page_cache
+
+    if _page_cache is None:
+        _page_cache = PageCache(cache_dirpath)
+    return _page_cache
@@ -14,7 +14,9 @@ class PluginBase(object):
 
         pass
 
-    def _connect_to_app(self, plugin_name, app_call_js_op, debug, info, warning, error, is_modal_dialog):
+    def _connect_to_app(self, plugin_name, app_call_js_op, debug, info, warning, error, is_modal_dialog,
+                        app_call_js_op_conflated=None, app_call_js_op_with_arrays=None, app_state_store=None,
+                        app_computed_values=None, app_patch_html=None):
 
         self.plugin_name = plugin_name
 
@@ -24,10 +26,17 @@ class PluginBase(object):
            'warning': warning,
            'error': error,
            'call_js_op': app_call_js_op,
+           'call_js_op_conflated': app_call_js_op_conflated,
+           'call_js_op_with_arrays': app_call_js_op_with_arrays,
+           'patch_html': app_patch_html,
         }
 
         self.is_modal_dialog = is_modal_dialog
 
+        # the app's StateStore and ComputedValueGraph, shared with the page (see WebEngineDialogBase)
+        self.state_store = app_state_store
+        self.computed_values = app_computed_values
+
     def debug(self, msg):
         self.app_functions['debug'](msg)
 
@@ -48,6 +57,25 @@ class PluginBase(object):
         plugin_op = 'Plugin|%s|%s' % (self.plugin_name, plugin_js_function_name)
         self.app_functions['call_js_op'](plugin_op, op_data)
 
+    def call_plugin_js_op_conflated(self, conflation_key, plugin_js_function_name, op_data):
+
+        # latest-wins version of call_plugin_js_op() for high frequency updates, see
+        # WebEngineDialogBase.call_js_op_conflated()
+        plugin_op = 'Plugin|%s|%s' % (self.plugin_name, plugin_js_function_name)
+        self.app_functions['call_js_op_conflated']('%s|%s' % (plugin_op, conflation_key), plugin_op, op_data)
+
+    def call_plugin_js_op_with_arrays(self, plugin_js_function_name, op_data):
+
+        # array-like values in op_data arrive in JS as typed arrays, see
+        # WebEngineDialogBase.call_js_op_with_arrays()
+        plugin_op = 'Plugin|%s|%s' % (self.plugin_name, plugin_js_function_name)
+        self.app_functions['call_js_op_with_arrays'](plugin_op, op_data)
+
+    def patch_html(self, target_id, html_str, force=False):
+
+        # see WebEngineDialogBase.patch_html()
+        return self.app_functions['patch_html'](target_id, html_str, force=force)
+
     def process_events(self):
         if self.is_modal_dialog:
             QApplication.instance().processEvents()
@@ -36,10 +36,10 @@ class PluginManager(object):
 
     PLUGIN_HTML_TEMPLATE = '''
 <!-- Plugin: {PLUGIN_NAME} (START) -->
-<script language="JavaScript">
+<script language="JavaScript" id="PWEG_{PLUGIN_NAME}_js">
 {PLUGIN_JS}
 </script>
-<style>
+<style id="PWEG_{PLUGIN_NAME}_css">
 {PLUGIN_CSS}
 </style>
 <div id="PWEG_{PLUGIN_NAME}">
@@ -158,6 +158,36 @@ class PluginManager(object):
 
         return all_plugins_html
 
+    def get_page_cache_key_info(self):
+
+        # everything get_all_plugins_html_str() output depends on ... plugin list, component file mtimes and
+        # the config (variation) of each plugin
+        key_info_list = []
+        for plugin_name in self.plugin_list:
+            p_info = self.plugin_info_by_name.get(plugin_name) or {}
+            component_mtime_list = [(info_key, p_info[info_key], os.path.getmtime(p_info[info_key]))
+                                    for info_key in ('html_path', 'css_path', 'js_path') if info_key in p_info]
+            key_info_list.append([plugin_name, component_mtime_list, p_info.get('config')])
+        return [self.PLUGIN_HTML_TEMPLATE, key_info_list]
+
+    def get_component_filepath_list(self):
+
+        # [(plugin_name, component, filepath), ...] for the HTML, CSS and JS components of all plugins, with
+        # component being "html", "css" or "js"
+        component_filepath_list = []
+        for plugin_name in self.plugin_list:
+            p_info = self.plugin_info_by_name.get(plugin_name) or {}
+            for component in ('html', 'css', 'js'):
+                if '%s_path' % component in p_info:
+                    component_filepath_list.append((plugin_name, component, p_info['%s_path' % component]))
+        return component_filepath_list
+
+    def get_plugin_component_str(self, plugin_name, component):
+
+        # the converted (token replaced) content of one plugin component, as it goes into the page
+        p_info = self.plugin_info_by_name[plugin_name]
+        return self._convert_component_file(plugin_name, p_info['%s_path' % component], p_info['config'])
+
     def load_python_plugin_code(self, plugin_name, src_plugin_path):
 
         active_plugin_dir_path = os.path.join(self.active_plugins_root, plugin_name)
@@ -182,7 +212,12 @@ class PluginManager(object):
                                         self.wed_obj.info,
                                         self.wed_obj.warning,
                                         self.wed_obj.error,
-                                        self.wed_obj.is_modal_dialog)
+                                        self.wed_obj.is_modal_dialog,
+                                        app_call_js_op_conflated=self.wed_obj.call_js_op_conflated,
+                                        app_call_js_op_with_arrays=self.wed_obj.call_js_op_with_arrays,
+                                        app_state_store=self.wed_obj.state_store,
+                                        app_computed_values=self.wed_obj.computed_values,
+                                        app_patch_html=self.wed_obj.patch_html)
 
         self.plugin_instance_by_name[plugin_name] = plugin_instance
 
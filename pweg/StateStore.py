@@ -0,0 +1,251 @@
+# -------------------------------------------------------------------------------
+# MIT License
+#
+# Copyright (c) 2021 pxlc@github
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# -------------------------------------------------------------------------------
+import copy
+import threading
+
+
+def split_state_path(path):
+
+    # a path is a JSON pointer str ("/shots/sh010/status", "" for the root) or a list of keys
+    if isinstance(path, (list, tuple)):
+        return list(path)
+    if not path or path == '/':
+        return []
+    return [k.replace('~1', '/').replace('~0', '~') for k in path.lstrip('/').split('/')]
+
+
+def join_state_path(key_list):
+
+    return ''.join(['/%s' % str(k).replace('~', '~0').replace('/', '~1') for k in key_list])
+
+
+class StateStore(object):
+    """
+    Application state shared with the page. Mutations go through set() / update() / delete(), which
+    record minimal JSON-patch operations (RFC 6902 "add", "replace" and "remove") against the previous
+    value. Pending patches are sent as one "PWEG_state_patch" JS op per outbound flush, i.e. at most once
+    per frame, and pweg.js applies them to its mirror of the state and notifies subscribers of the
+    changed paths (see pweg.subscribe_state()).
+
+    A patch that replaces a path drops any pending patches at or below that path, so values that change
+    many times between flushes are only sent once. Safe to use from any thread.
+    """
+
+    def __init__(self, request_flush_fn=None):
+
+        self.lock = threading.Lock()
+        self.state_d = {}
+        self.pending_patch_list = []
+        self.is_list_remove_pending = False
+        self.is_full_sync_pending = False
+        self.request_flush_fn = request_flush_fn
+        self.change_listener_list = []
+
+        self.stats = {'mutations': 0, 'patch_ops_recorded': 0, 'patch_ops_sent': 0, 'flushes': 0,
+                      'full_syncs': 0}
+
+    def add_change_listener(self, change_listener_fn):
+
+        # change_listener_fn(changed_path_list) is called after each mutation (outside the store lock), with
+        # the JSON pointer paths of the recorded patch operations
+        self.change_listener_list.append(change_listener_fn)
+
+    def _resolve(self, key_list):
+
+        value = self.state_d
+        for key in key_list:
+            if isinstance(value, list):
+                key = int(key)
+                if key >= len(value):
+                    raise KeyError(key)
+            value = value[key]
+        return value
+
+    def get(self, path='', default=None):
+
+        # returns a copy, mutating it doesn't change the state
+        with self.lock:
+            try:
+                return copy.deepcopy(self._resolve(split_state_path(path)))
+            except (KeyError, IndexError, ValueError, TypeError):
+                return default
+
+    def get_snapshot(self):
+
+        return self.get('')
+
+    def _record(self, patch_op, key_list, value=None, is_list_remove=False):
+
+        path = join_state_path(key_list)
+        path_prefix = path + '/'
+        # Pending patches at (or below) path are superseded, the state there is being overwritten ... except
+        # behind a pending list "remove", which shifts the list, so the same index path names another element
+        if not self.is_list_remove_pending:
+            self.pending_patch_list = [p for p in self.pending_patch_list
+                                       if p['path'] != path and not p['path'].startswith(path_prefix)]
+        self.is_list_remove_pending = self.is_list_remove_pending or is_list_remove
+        patch_d = {'op': patch_op, 'path': path}
+        if patch_op != 'remove':
+            patch_d['value'] = copy.deepcopy(value)
+        self.pending_patch_list.append(patch_d)
+        self.stats['patch_ops_recorded'] += 1
+        return path
+
+    def _diff(self, key_list, old_value, new_value, changed_path_list):
+
+        if isinstance(old_value, dict) and isinstance(new_value, dict):
+            for key in old_value:
+                if key not in new_value:
+                    changed_path_list.append(self._record('remove', key_list + [key]))
+            for (key, value) in new_value.items():
+                if key not in old_value:
+                    changed_path_list.append(self._record('add', key_list + [key], value))
+                else:
+                    self._diff(key_list + [key], old_value[key], value, changed_path_list)
+            return
+
+        if isinstance(old_value, list) and isinstance(new_value, list) and len(old_value) == len(new_value):
+            for (index, value) in enumerate(new_value):
+                self._diff(key_list + [index], old_value[index], value, changed_path_list)
+            return
+
+        if type(old_value) != type(new_value) or old_value != new_value:
+            changed_path_list.append(self._record('replace', key_list, new_value))
+
+    def _mutated(self, changed_path_list):
+
+        if not changed_path_list:
+            return
+        if self.request_flush_fn:
+            self.request_flush_fn()
+        for change_listener_fn in self.change_listener_list:
+            change_listener_fn(changed_path_list)
+
+    def set(self, path, value):
+
+        # Sets the value at path, creating missing parent dicts. Only the differences to the current value
+        # are recorded, so setting an unchanged value sends nothing.
+        key_list = split_state_path(path)
+        changed_path_list = []
+
+        with self.lock:
+            self.stats['mutations'] += 1
+            value = copy.deepcopy(value)
+
+            if not key_list:
+                old_state_d = self.state_d
+                self.state_d = value
+                self._diff([], old_state_d, value, changed_path_list)
+            else:
+                container = self.state_d
+                for (depth, key) in enumerate(key_list[:-1]):
+                    if isinstance(container, list):
+                        container = container[int(key)]
+                        continue
+                    if not isinstance(container.get(key), (dict, list)):
+                        container[key] = {}
+                        changed_path_list.append(self._record('add', key_list[:depth + 1], {}))
+                    container = container[key]
+
+                last_key = key_list[-1]
+                if isinstance(container, list):
+                    last_key = int(last_key)
+                    old_value = container[last_key]
+                    container[last_key] = value
+                    self._diff(key_list, old_value, value, changed_path_list)
+                elif last_key in container:
+                    old_value = container[last_key]
+                    container[last_key] = value
+                    self._diff(key_list, old_value, value, changed_path_list)
+                else:
+                    container[last_key] = value
+                    changed_path_list.append(self._record('add', key_list, value))
+
+        self._mutated(changed_path_list)
+
+    def update(self, path, value_d):
+
+        # sets each key of value_d below path (a dict), leaving other keys in place
+        key_list = split_state_path(path)
+        for (key, value) in value_d.items():
+            self.set(key_list + [key], value)
+
+    def delete(self, path):
+
+        key_list = split_state_path(path)
+        if not key_list:
+            self.set('', {})
+            return
+
+        changed_path_list = []
+        with self.lock:
+            self.stats['mutations'] += 1
+            try:
+                container = self._resolve(key_list[:-1])
+                is_list_remove = isinstance(container, list)
+                last_key = int(key_list[-1]) if is_list_remove else key_list[-1]
+                del container[last_key]
+            except (KeyError, IndexError, ValueError, TypeError):
+                return
+            changed_path_list.append(self._record('remove', key_list, is_list_remove=is_list_remove))
+
+        self._mutated(changed_path_list)
+
+    def request_full_sync(self):
+
+        # the page's mirror is empty (e.g. after a page (re)load), so the next patch replaces the whole state
+        with self.lock:
+            self.is_full_sync_pending = True
+            self.pending_patch_list = []
+            self.is_list_remove_pending = False
+        if self.request_flush_fn:
+            self.request_flush_fn()
+
+    def take_patch_messages(self):
+
+        # outbound queue flush hook (GUI thread) ... returns the pending patch as a JS op message list
+        with self.lock:
+            if self.is_full_sync_pending:
+                self.is_full_sync_pending = False
+                self.pending_patch_list = []
+                self.is_list_remove_pending = False
+                patch_list = [{'op': 'replace', 'path': '', 'value': copy.deepcopy(self.state_d)}]
+                self.stats['full_syncs'] += 1
+            else:
+                patch_list = self.pending_patch_list
+                self.pending_patch_list = []
+                self.is_list_remove_pending = False
+            if not patch_list:
+                return None
+            self.stats['patch_ops_sent'] += len(patch_list)
+            self.stats['flushes'] += 1
+
+        return [('PWEG_state_patch', patch_list)]
+
+    def get_stats(self):
+
+        with self.lock:
+            stats = dict(self.stats)
+            stats['pending_patch_ops'] = len(self.pending_patch_list)
+        return stats
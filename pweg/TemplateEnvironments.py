@@ -0,0 +1,65 @@
+# -------------------------------------------------------------------------------
+# MIT License
+#
+# Copyright (c) 2021 pxlc@github
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# -------------------------------------------------------------------------------
+import os
+import sys
+import threading
+
+import jinja2
+
+
+_template_env_by_dir = {}
+_template_env_lock = threading.Lock()
+
+
+def get_user_temp_root():
+
+    if sys.platform == 'win32':
+        return '%s/_pxlc_temp' % os.path.expandvars('${USERPROFILE}/AppData/Local/Temp').replace('\\', '/')
+    return os.path.expandvars('${HOME}/.pxlc_temp')
+
+
+def get_template_environment(template_dir):
+
+    # One jinja2 Environment per template directory for the whole process, so re-opening a dialog reuses
+    # the templates it already compiled. Compiled templates are also kept on disk under the user temp root
+    # and so survive restarts (e.g. of a DCC session). A template whose file changed is recompiled: the
+    # environment checks the file mtime before using a loaded template, and the bytecode cache entries are
+    # keyed by a checksum of the template source.
+    template_dir = os.path.abspath(template_dir).replace('\\', '/')
+
+    with _template_env_lock:
+        if template_dir not in _template_env_by_dir:
+            bytecode_cache = None
+            bytecode_cache_dirpath = '%s/jinja2_bytecode_cache' % get_user_temp_root()
+            try:
+                if not os.path.isdir(bytecode_cache_dirpath):
+                    os.makedirs(bytecode_cache_dirpath)
+                bytecode_cache = jinja2.FileSystemBytecodeCache(bytecode_cache_dirpath)
+            except OSError:
+                pass  # compiled templates are then only cached in memory
+
+            _template_env_by_dir[template_dir] = jinja2.Environment(loader=jinja2.FileSystemLoader(template_dir),
+                                                                    bytecode_cache=bytecode_cache,
+                                                                    auto_reload=True)
+        return _template_env_by_dir[template_dir]
@@ -0,0 +1,149 @@
+# -------------------------------------------------------------------------------
+# MIT License
+#
+# Copyright (c) 2021 pxlc@github
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# -------------------------------------------------------------------------------
+import sys
+import array
+import base64
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# --------------------------------------------------------------------------------------------------------
+#  Typed array transport ... array-like values (array.array, memoryview, numpy arrays) are sent to the
+#  page as raw little-endian buffers instead of JSON lists, and arrive in JS as typed array views (e.g.
+#  Float32Array). In the op data each one is replaced by a descriptor dict:
+#
+#      {TYPED_ARRAY_KEY: {'dtype': 'float32', 'shape': [n], 'url': 'pweg://...'}}
+#
+#  with 'b64' (the buffer, base64 encoded) instead of 'url' when the "pweg" scheme could not be
+#  registered. pweg.js fetches/decodes the buffers and puts the typed arrays in place of the descriptors.
+# --------------------------------------------------------------------------------------------------------
+
+TYPED_ARRAY_KEY = '__pweg_typed_array__'
+
+# dtype names match the JS typed array constructors pweg.js uses for them (float32 -> Float32Array, ...)
+DTYPE_BY_TYPECODE_AND_SIZE = {
+    ('b', 1): 'int8', ('B', 1): 'uint8', ('c', 1): 'uint8',
+    ('h', 2): 'int16', ('H', 2): 'uint16',
+    ('i', 4): 'int32', ('I', 4): 'uint32', ('l', 4): 'int32', ('L', 4): 'uint32',
+    ('l', 8): 'int64', ('L', 8): 'uint64', ('q', 8): 'int64', ('Q', 8): 'uint64',
+    ('f', 4): 'float32', ('d', 8): 'float64',
+}
+
+NUMPY_DTYPE_BY_KIND_AND_SIZE = {
+    ('i', 1): 'int8', ('u', 1): 'uint8', ('b', 1): 'uint8',
+    ('i', 2): 'int16', ('u', 2): 'uint16',
+    ('i', 4): 'int32', ('u', 4): 'uint32',
+    ('i', 8): 'int64', ('u', 8): 'uint64',
+    ('f', 4): 'float32', ('f', 8): 'float64',
+}
+
+
+def _array_to_bytes(value):
+
+    # array.array.tobytes() only exists on Python 3 (tostring() there is deprecated)
+    return value.tobytes() if hasattr(value, 'tobytes') else value.tostring()
+
+
+def get_typed_array_buffer(value):
+
+    # Returns (dtype, shape, little-endian bytes) for an array-like value, or None if value isn't one
+    # (or has an element type JS typed arrays can't represent, e.g. complex numbers)
+    if isinstance(value, array.array):
+        dtype = DTYPE_BY_TYPECODE_AND_SIZE.get((value.typecode, value.itemsize))
+        if dtype is None:
+            return None
+        if sys.byteorder != 'little' and value.itemsize > 1:
+            value = array.array(value.typecode, value)
+            value.byteswap()
+        return (dtype, [len(value)], _array_to_bytes(value))
+
+    if isinstance(value, memoryview):
+        typecode = value.format.lstrip('@=<')
+        dtype = DTYPE_BY_TYPECODE_AND_SIZE.get((typecode, value.itemsize))
+        if dtype is None:
+            return None
+        if sys.byteorder != 'little' and value.itemsize > 1 and not value.format.startswith('<'):
+            return get_typed_array_buffer(array.array(typecode, value.tobytes())) if value.ndim == 1 else None
+        return (dtype, list(value.shape), value.tobytes())
+
+    if numpy is not None and isinstance(value, numpy.ndarray):
+        dtype = NUMPY_DTYPE_BY_KIND_AND_SIZE.get((value.dtype.kind, value.dtype.itemsize))
+        if dtype is None:
+            return None
+        little_endian_dtype = value.dtype.newbyteorder('<')
+        return (dtype, list(value.shape),
+                numpy.ascontiguousarray(value, dtype=little_endian_dtype).tobytes())
+
+    return None
+
+
+def replace_typed_arrays(data, add_buffer_fn):
+
+    # Returns a copy of data (dicts, lists and tuples are walked) with every array-like value replaced by
+    # its descriptor. add_buffer_fn(buffer_bytes) registers a buffer and returns its URL, or None to have
+    # the buffer embedded base64 encoded instead.
+    buffer_info = get_typed_array_buffer(data)
+    if buffer_info is not None:
+        (dtype, shape, buffer_bytes) = buffer_info
+        descriptor_d = {'dtype': dtype, 'shape': shape}
+        buffer_url = add_buffer_fn(buffer_bytes)
+        if buffer_url:
+            descriptor_d['url'] = buffer_url
+        else:
+            descriptor_d['b64'] = base64.b64encode(buffer_bytes).decode('ascii')
+        return {TYPED_ARRAY_KEY: descriptor_d}
+
+    if isinstance(data, dict):
+        return {k: replace_typed_arrays(v, add_buffer_fn) for (k, v) in data.items()}
+    if isinstance(data, (list, tuple)):
+        return [replace_typed_arrays(v, add_buffer_fn) for v in data]
+    return data
+
+
+def to_columns(row_list, column_names=None, numeric_typecode='d'):
+
+    # Turns tabular data (a list of row dicts) into a dict of columns, so a table is sent column by
+    # column ... columns holding only numbers become array.array(numeric_typecode) and so arrive in JS as
+    # typed arrays (Float64Array by default), other columns stay lists.
+    if column_names is None:
+        # every key found in any row (in first seen order), rows that lack one get None for it
+        column_names = []
+        column_name_set = set()
+        for row in row_list:
+            for column_name in row:
+                if column_name not in column_name_set:
+                    column_name_set.add(column_name)
+                    column_names.append(column_name)
+
+    column_d = {}
+    for column_name in column_names:
+        value_list = [row.get(column_name) for row in row_list]
+        if value_list and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in value_list):
+            column_d[column_name] = array.array(numeric_typecode, value_list)
+        else:
+            column_d[column_name] = value_list
+    return column_d
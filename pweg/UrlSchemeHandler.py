@@ -0,0 +1,280 @@
+# -------------------------------------------------------------------------------
+# MIT License
+#
+# Copyright (c) 2021 pxlc@github
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# -------------------------------------------------------------------------------
+
+
+import os
+import sys
+import uuid
+import mimetypes
+
+_PWEG_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__))).replace('\\', '/')
+sys.path.insert(0, '%s/thirdparty_packages' % _PWEG_ROOT)  # to include QtPy package
+
+from qtpy import PYSIDE2
+from qtpy.QtCore import QBuffer, QByteArray, QCoreApplication, QFile, QIODevice, QTimer
+from qtpy.QtWebEngineWidgets import QWebEngineProfile
+
+# NOTE: the bundled QtPy doesn't wrap QtWebEngineCore, so import from the binding QtPy selected
+if PYSIDE2:
+    from PySide2.QtWebEngineCore import QWebEngineUrlSchemeHandler, QWebEngineUrlRequestJob, \
+        QWebEngineUrlRequestInterceptor, QWebEngineUrlRequestInfo
+    try:
+        from PySide2.QtWebEngineCore import QWebEngineUrlScheme
+    except ImportError:
+        QWebEngineUrlScheme = None  # Qt < 5.12
+else:
+    from PyQt5.QtWebEngineCore import QWebEngineUrlSchemeHandler, QWebEngineUrlRequestJob, \
+        QWebEngineUrlRequestInterceptor, QWebEngineUrlRequestInfo
+    try:
+        from PyQt5.QtWebEngineCore import QWebEngineUrlScheme
+    except ImportError:
+        QWebEngineUrlScheme = None  # Qt < 5.12
+
+
+PWEG_URL_SCHEME = 'pweg'
+
+
+def register_pweg_url_scheme():
+
+    # Custom schemes have to be registered before the QApplication is created. When running inside a DCC
+    # the application already exists, in which case the scheme handler still works but Chromium treats
+    # "pweg://" as a plain unregistered scheme.
+    if QWebEngineUrlScheme is None or QCoreApplication.instance() is not None:
+        return False
+
+    scheme = QWebEngineUrlScheme(PWEG_URL_SCHEME.encode('ascii'))
+    scheme.setSyntax(QWebEngineUrlScheme.Syntax.Host)
+    scheme_flags = QWebEngineUrlScheme.SecureScheme | QWebEngineUrlScheme.LocalScheme | \
+        QWebEngineUrlScheme.LocalAccessAllowed
+    if hasattr(QWebEngineUrlScheme, 'CorsEnabled'):
+        scheme_flags |= QWebEngineUrlScheme.CorsEnabled  # Qt 5.14+
+    scheme.setFlags(scheme_flags)
+    QWebEngineUrlScheme.registerScheme(scheme)
+    return True
+
+
+class GeneratorIODevice(QIODevice):
+    """
+    Sequential, read-only QIODevice that pulls its content from an iterable of bytes chunks, so a
+    stream is never held in memory as a whole.
+    """
+    def __init__(self, chunk_iterable, parent=None):
+
+        super(GeneratorIODevice, self).__init__(parent)
+
+        self.chunk_iter = iter(chunk_iterable)
+        self.pending_bytes = b''
+        self.is_exhausted = False
+
+    def _fill(self, byte_count):
+
+        while not self.is_exhausted and len(self.pending_bytes) < byte_count:
+            try:
+                chunk = next(self.chunk_iter)
+            except StopIteration:
+                self.is_exhausted = True
+                break
+            if chunk:
+                self.pending_bytes += chunk if isinstance(chunk, bytes) else chunk.encode('utf-8')
+
+    def open(self, mode):
+
+        result = super(GeneratorIODevice, self).open(mode)
+        QTimer.singleShot(0, self.readyRead.emit)
+        return result
+
+    def isSequential(self):
+
+        return True
+
+    def bytesAvailable(self):
+
+        self._fill(1)
+        return len(self.pending_bytes) + super(GeneratorIODevice, self).bytesAvailable()
+
+    def atEnd(self):
+
+        self._fill(1)
+        return not self.pending_bytes
+
+    def readData(self, max_size):
+
+        self._fill(max_size)
+        data = self.pending_bytes[:max_size]
+        self.pending_bytes = self.pending_bytes[max_size:]
+
+        if self.is_exhausted and not self.pending_bytes:
+            QTimer.singleShot(0, self.readChannelFinished.emit)
+        return data
+
+    def writeData(self, data):
+
+        return -1
+
+
+class PwegUrlSchemeHandler(QWebEngineUrlSchemeHandler):
+    """
+    Serves "pweg://<namespace>/<key>" URLs from Python registered resources, which can be:
+
+        - bytes in memory
+        - files on disk (streamed, never fully loaded)
+        - a generator function returning an iterable of bytes chunks (called per request)
+        - a directory on disk (serves any file below it, e.g. resources relative to a page)
+
+    Bytes and file resources are served through seekable devices, so Range requests (e.g. media seeking
+    or partial fetch() requests) are answered by QtWebEngine without reading the whole resource.
+    """
+    def __init__(self, parent=None):
+
+        super(PwegUrlSchemeHandler, self).__init__(parent)
+
+        self.resource_by_url = {}
+        self.request_handler_by_namespace = {}  # namespaces whose requests are answered by a function
+
+    @staticmethod
+    def new_namespace():
+
+        return uuid.uuid4().hex[:12]
+
+    @staticmethod
+    def _url_key(namespace, key):
+
+        return '%s/%s' % (namespace.lower(), key.lstrip('/'))
+
+    def _add_resource(self, namespace, key, resource_type, resource, mime_type):
+
+        self.resource_by_url[self._url_key(namespace, key)] = (resource_type, resource, mime_type)
+        return '%s://%s' % (PWEG_URL_SCHEME, self._url_key(namespace, key))
+
+    def add_bytes(self, namespace, key, data_bytes, mime_type='application/octet-stream', serve_once=False):
+
+        # a serve_once resource is removed by the request that fetches it (e.g. a one-off data buffer)
+        resource_type = 'bytes_once' if serve_once else 'bytes'
+        return self._add_resource(namespace, key, resource_type, QByteArray(bytes(data_bytes)), mime_type)
+
+    def add_file(self, namespace, key, filepath, mime_type=None):
+
+        if not mime_type:
+            mime_type = mimetypes.guess_type(filepath)[0] or 'application/octet-stream'
+        return self._add_resource(namespace, key, 'file', filepath, mime_type)
+
+    def add_stream(self, namespace, key, chunk_generator_fn, mime_type='application/octet-stream'):
+
+        return self._add_resource(namespace, key, 'stream', chunk_generator_fn, mime_type)
+
+    def add_directory(self, namespace, key, dirpath):
+
+        # "pweg://<namespace>/<key>/<relative path>" serves <dirpath>/<relative path>
+        return self._add_resource(namespace, key.rstrip('/'), 'directory', os.path.abspath(dirpath), None)
+
+    def _find_directory_file(self, url_key):
+
+        key_bits = url_key.split('/')
+        for bit_count in range(len(key_bits) - 1, 0, -1):
+            resource_info = self.resource_by_url.get('/'.join(key_bits[:bit_count]))
+            if not resource_info or resource_info[0] != 'directory':
+                continue
+            filepath = os.path.normpath(os.path.join(resource_info[1], *key_bits[bit_count:]))
+            if not filepath.startswith(resource_info[1] + os.sep):
+                return None  # no escaping the directory with ".." paths
+            return filepath
+        return None
+
+    def set_namespace_request_handler(self, namespace, request_handler_fn):
+
+        # request_handler_fn(job, key) answers every request for "pweg://<namespace>/<key>" itself
+        self.request_handler_by_namespace[namespace.lower()] = request_handler_fn
+
+    def remove(self, namespace, key):
+
+        self.resource_by_url.pop(self._url_key(namespace, key), None)
+
+    def remove_namespace(self, namespace):
+
+        prefix = '%s/' % namespace.lower()
+        for url_key in [k for k in self.resource_by_url if k.startswith(prefix)]:
+            del self.resource_by_url[url_key]
+
+    def requestStarted(self, job):
+
+        url = job.requestUrl()
+        if url.host() in self.request_handler_by_namespace:
+            self.request_handler_by_namespace[url.host()](job, url.path().lstrip('/'))
+            return
+
+        url_key = self._url_key(url.host(), url.path())
+
+        if url_key in self.resource_by_url and self.resource_by_url[url_key][0] != 'directory':
+            (resource_type, resource, mime_type) = self.resource_by_url[url_key]
+        else:
+            filepath = self._find_directory_file(url_key)
+            if not filepath:
+                job.fail(QWebEngineUrlRequestJob.UrlNotFound)
+                return
+            (resource_type, resource, mime_type) = ('file', filepath,
+                                                    mimetypes.guess_type(filepath)[0] or 'application/octet-stream')
+
+        if resource_type == 'bytes_once':
+            self.resource_by_url.pop(url_key, None)
+
+        if resource_type in ('bytes', 'bytes_once'):
+            device = QBuffer(job)
+            device.setData(resource)
+        elif resource_type == 'file':
+            if not os.path.isfile(resource):
+                job.fail(QWebEngineUrlRequestJob.UrlNotFound)
+                return
+            device = QFile(resource, job)
+        else:
+            try:
+                device = GeneratorIODevice(resource(), parent=job)
+            except:
+                job.fail(QWebEngineUrlRequestJob.RequestFailed)
+                return
+
+        if not device.open(QIODevice.ReadOnly):
+            job.fail(QWebEngineUrlRequestJob.RequestFailed)
+            return
+
+        job.reply(mime_type.encode('ascii'), device)
+
+
+_url_scheme_handler = None
+
+
+def get_url_scheme_handler():
+
+    # one handler is shared by all dialogs (they all use the default profile, which only accepts one
+    # handler per scheme) ... each dialog registers its resources under its own namespace
+    global _url_scheme_handler
+
+    if _url_scheme_handler is None:
+        _url_scheme_handler = PwegUrlSchemeHandler()
+        QWebEngineProfile.defaultProfile().installUrlSchemeHandler(PWEG_URL_SCHEME.encode('ascii'),
+                                                                   _url_scheme_handler)
+    return _url_scheme_handler
+
+
+# NOTE: needs to happen on import, i.e. before the app creates its QApplication
+PWEG_URL_SCHEME_IS_REGISTERED = register_pweg_url_scheme()
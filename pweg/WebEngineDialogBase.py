@@ -2,11 +2,14 @@
 import os
 import sys
 import json
-import base64
+import hashlib
+import inspect
+import itertools
 import jinja2
 import getpass
 import logging
 import datetime
+import traceback
 
 _PWEG_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__))).replace('\\', '/')
 sys.path.insert(0, '%s/thirdparty_packages' % _PWEG_ROOT)  # to include QtPy package
@@ -14,44 +17,226 @@ sys.path.insert(0, '%s/thirdparty_packages' % _PWEG_ROOT)  # to include QtPy pac
 from qtpy.QtWidgets import QApplication, QWidget, QDialog, QVBoxLayout
 from qtpy.QtWebEngineWidgets import QWebEngineView, QWebEnginePage
 from qtpy.QtWebChannel import QWebChannel
-from qtpy.QtCore import QUrl, Slot, QObject, QUrl, Qt, QMargins
+from qtpy.QtCore import QUrl, Slot, Signal, QObject, QUrl, Qt, QMargins, QThread, QTimer, QFileSystemWatcher
 
 # local imports
 from .util import register_op
 from .PluginManager import PluginManager
+from .OpExecutor import OpExecutor, OpCancelToken, bind_cancel_token
+from .UrlSchemeHandler import get_url_scheme_handler, PWEG_URL_SCHEME_IS_REGISTERED
+from .MessageCodec import JsonMessageCodec, get_message_codec
+from .OpResultCache import OpResultCache
+from .OpMetrics import OpMetrics, perf_timer
+from .OpScheduler import OpScheduler, OpPriorities
+from .OutboundQueue import OutboundMessageQueue
+from .JSCallFuture import JSCallFuture, JSCallError, JSCallTimeoutError
+from .TypedArrays import replace_typed_arrays
+from .StateStore import StateStore
+from .ComputedValues import ComputedValueGraph
+from .TemplateEnvironments import get_template_environment, get_user_temp_root
+from .PageCache import get_page_cache
+from .AssetCache import get_asset_cache
 
 
 class JSPythonCallHandler(QObject):
 
+    # Python -> JS op push channel ... pweg.js connects to this once, so each push is a plain web channel
+    # message (no per-call script compilation like runJavaScript)
+    js_ops_pushed = Signal(str)  # encoded list of [JS op name, op data] pairs, see OutboundMessageQueue
+
+    channel_connected = Signal()  # pweg.init() has connected the page's web channel
+
     def __init__(self, *args, **kwargs):
         super(JSPythonCallHandler, self).__init__(*args, **kwargs)
         self.op_registry_d = None
+        self.op_executor = None
+        self.message_codec = JsonMessageCodec()
+        self.op_result_cache = None
+        self.op_metrics = None
+        self.op_scheduler = None
+
+    def set_op_scheduler(self, op_scheduler):
+        self.op_scheduler = op_scheduler
+
+    def set_op_metrics(self, op_metrics):
+        self.op_metrics = op_metrics
+
+    def set_op_result_cache(self, op_result_cache):
+        self.op_result_cache = op_result_cache
+
+    def set_message_codec(self, message_codec):
+        self.message_codec = message_codec
 
     def set_op_registry(self, op_registry_d):
         self.op_registry_d = op_registry_d
 
-    @Slot(str, result=str)
-    def to_python(self, data_d_str):
+    def set_op_executor(self, op_executor):
+        self.op_executor = op_executor
+
+    def _run_op(self, data_d):
+
         if not self.op_registry_d:
-            return json.dumps({
-                        'ret_status': 'ERROR', 'message': 'Command Registry has not been set'
-                   })
+            return {'ret_status': 'ERROR', 'message': 'Command Registry has not been set'}
 
-        data_d = json.loads(data_d_str)
         op = data_d.get('op')
         op_data = data_d.get('op_data')
 
         if op is None:
-            return json.dumps({
-                        'ret_status': 'ERROR', 'message': 'No "op" key specified or "op" value is null/None'
-                   })
+            return {'ret_status': 'ERROR', 'message': 'No "op" key specified or "op" value is null/None'}
         if op not in self.op_registry_d:
-            return json.dumps({
-                        'ret_status': 'ERROR', 'message': '"op" name "%s" is not registered' % op
-                   })
+            return {'ret_status': 'ERROR', 'message': '"op" name "%s" is not registered' % op}
         op_fn = self.op_registry_d[op]
-        result_data = op_fn(op_data)
-        return json.dumps(result_data)
+        op_options = getattr(op_fn, '_op_options', {})
+
+        cancel_token = None
+        if op_options.get('cancellable'):
+            cancel_token = OpCancelToken()
+            op_fn = bind_cancel_token(op_fn, cancel_token)
+
+        cache_key = None
+        if op_options.get('cache') is not None or op_options.get('coalesce'):
+            cache_key = OpResultCache.make_key(op_data)
+
+        cache_options = op_options.get('cache')
+        if self.op_result_cache and cache_options is not None:
+            (is_hit, cached_result) = self.op_result_cache.lookup(op, cache_key)
+            if is_hit:
+                return cached_result
+            op_fn = self.op_result_cache.wrap_op_fn(op, cache_key, op_fn, cache_options, cancel_token=cancel_token)
+
+        request_id = data_d.get('request_id') or ''
+        coalesce_key = (op, cache_key) if op_options.get('coalesce') else None
+
+        if self.op_scheduler and self.op_executor and self.op_scheduler.is_queued_lane(op_options.get('priority')):
+            # result gets delivered to JS via the "PWEG_op_result" JS op once the scheduler has run the op
+            # ... unless the caller sent it with "no_result" (e.g. pweg.js log messages)
+            def _dispatch_queued_op():
+                self._execute_op(request_id, op, op_fn, op_data, op_options, coalesce_key, cancel_token,
+                                 is_deferred=True, deliver_deferred_result=not data_d.get('no_result'))
+
+            self.op_scheduler.enqueue(request_id, op, _dispatch_queued_op)
+            return {'_pweg_background': request_id}
+
+        return self._execute_op(request_id, op, op_fn, op_data, op_options, coalesce_key, cancel_token)
+
+    def _execute_op(self, request_id, op, op_fn, op_data, op_options, coalesce_key, cancel_token,
+                    is_deferred=False, deliver_deferred_result=True):
+
+        if self.op_executor and op_options.get('background'):
+            # result gets delivered to JS via the "PWEG_op_result" JS op once the op completes
+            if self.op_metrics:
+                op_fn = self.op_metrics.timed_op_fn(op, op_fn)
+            self.op_executor.submit(request_id, op, op_fn, op_data, coalesce_key=coalesce_key,
+                                    cancel_token=cancel_token,
+                                    priority=OpPriorities.THREADPOOL_PRIORITY.get(op_options.get('priority'), 1))
+            return {'_pweg_background': request_id}
+
+        if is_deferred:
+            # the web channel call already returned, so the result has to be delivered like a background one
+            try:
+                result_data = op_fn(op_data)
+            except:
+                result_data = {
+                    'ret_status': 'ERROR',
+                    'message': 'Exception occurred in queued op "%s" - stack trace follows.\n\n%s' %
+                               (op, traceback.format_exc())
+                }
+        else:
+            result_data = op_fn(op_data)
+
+        if self.op_executor and inspect.isgenerator(result_data):
+            # generator op ... chunks go to JS via the "PWEG_op_chunk" JS op, then the result as above
+            self.op_executor.stream_on_gui_thread(request_id, op, result_data)
+            return {'_pweg_background': request_id}
+
+        if is_deferred and deliver_deferred_result:
+            self.op_executor.deliver_result(request_id, op, result_data)
+
+        return result_data
+
+    @Slot(str, result=str)
+    def to_python(self, data_d_str):
+
+        start_time = perf_timer()
+        data_d = self.message_codec.decode(data_d_str)
+        decoded_time = perf_timer()
+        result_data = self._run_op(data_d)
+        executed_time = perf_timer()
+        result_str = self.message_codec.encode(result_data)
+
+        if self.op_metrics:
+            self.op_metrics.record('to_python', str(data_d.get('op')),
+                                   {'decode': decoded_time - start_time, 'execute': executed_time - decoded_time,
+                                    'encode': perf_timer() - executed_time},
+                                   request_size=len(data_d_str), response_size=len(result_str))
+        return result_str
+
+    @Slot()
+    def channel_ready(self):
+
+        self.channel_connected.emit()
+
+    @Slot(str)
+    def cancel_op(self, request_id):
+
+        # the JS caller no longer wants the result of this request
+        if self.op_scheduler and self.op_scheduler.cancel(request_id):
+            return
+        if self.op_executor:
+            self.op_executor.cancel(request_id)
+
+    @Slot(str, result=str)
+    def to_python_batch(self, data_list_str):
+
+        # runs a list of op requests in one web channel call, returning the list of results in the same
+        # order ... an op that raises only produces an ERROR result for its own slot in the list
+        start_time = perf_timer()
+        data_list = self.message_codec.decode(data_list_str)
+        decode_secs = perf_timer() - start_time
+        result_list = []
+
+        for data_d in data_list:
+            try:
+                op_start_time = perf_timer()
+                result_list.append(self._run_op(data_d))
+                if self.op_metrics:
+                    self.op_metrics.record('to_python', str(data_d.get('op')),
+                                           {'execute': perf_timer() - op_start_time})
+            except:
+                result_list.append({
+                    'ret_status': 'ERROR',
+                    'message': 'Exception occurred in batched op "%s" - stack trace follows.\n\n%s' %
+                               (data_d.get('op'), traceback.format_exc())
+                })
+
+        encode_start_time = perf_timer()
+        try:
+            result_list_str = self.message_codec.encode(result_list)
+        except (TypeError, ValueError):
+            result_list_str = None
+
+        if result_list_str is None:
+            result_list_str = self._encode_result_list_isolated(data_list, result_list)
+
+        if self.op_metrics:
+            self.op_metrics.record('to_python', '__batch__',
+                                   {'decode': decode_secs, 'encode': perf_timer() - encode_start_time},
+                                   request_size=len(data_list_str), response_size=len(result_list_str))
+        return result_list_str
+
+    def _encode_result_list_isolated(self, data_list, result_list):
+
+        # at least one result is not JSON serializable, so isolate it
+        result_str_list = []
+        for (data_d, result_data) in zip(data_list, result_list):
+            try:
+                result_str_list.append(self.message_codec.encode(result_data))
+            except (TypeError, ValueError) as err:
+                result_str_list.append(self.message_codec.encode({
+                    'ret_status': 'ERROR',
+                    'message': 'Result of batched op "%s" is not JSON serializable: %s' % (data_d.get('op'), err)
+                }))
+        return '[%s]' % ','.join(result_str_list)
 
 
 class WebEnginePage(QWebEnginePage):
@@ -65,9 +250,18 @@ class WebEnginePage(QWebEnginePage):
 
 class WebEngineDialogBase(QDialog):
 
+    _run_js_requested = Signal(str)  # run_js() called off the GUI thread
+    _run_js_async_requested = Signal(str, object, object)  # run_js_async() called off the GUI thread
+
+    MAX_WATCHED_FILE_MISSING_CHECKS = 10  # hot reload, ~5 secs before a missing watched file counts as deleted
+
     def __init__(self, parent=None, app_module_path='', html_filepath='', app_title='', width=500, height=200,
                  requested_plugins_list=None, override_session_log_filepath='',
-                 log_level_str='INFO', log_to_shell=True, is_modal_dialog=False):
+                 log_level_str='INFO', log_to_shell=True, is_modal_dialog=False, max_background_op_threads=None,
+                 message_codec=None, dump_op_stats_on_close=False, bulk_ops_per_sec=100, bulk_max_queue_depth=500,
+                 bulk_overflow='shed', js_op_flush_interval_msecs=16, use_page_cache=True,
+                 watch_for_changes=False, cache_external_assets=False, asset_cache_seed_dirpath=None,
+                 asset_cache_offline_only=False):
 
         super(WebEngineDialogBase, self).__init__(parent)
 
@@ -84,6 +278,7 @@ class WebEngineDialogBase(QDialog):
                                 else '%s_TEMPLATE.html' % os.path.splitext(self.app_module_path)[0]
 
         self.is_modal_dialog = is_modal_dialog
+        self.is_closed_down = False  # see _close_down()
 
         self.setWindowTitle(self.app_title)
         self.setModal(self.is_modal_dialog)
@@ -99,6 +294,33 @@ class WebEngineDialogBase(QDialog):
 
         # Set up JS-to-Python communication bridge via web channel
         self.js_python_call_handler = JSPythonCallHandler()
+
+        # Codec for op messages in both directions ... None picks the fastest available one (e.g. "orjson")
+        self.message_codec = get_message_codec(message_codec)
+        self.js_python_call_handler.set_message_codec(self.message_codec)
+
+        # call_js_op() messages are queued (from any thread) and pushed to the page in one batch per frame
+        self.outbound_queue = OutboundMessageQueue(self.js_python_call_handler.js_ops_pushed.emit,
+                                                   self.message_codec.encode,
+                                                   frame_interval_msecs=js_op_flush_interval_msecs,
+                                                   error_fn=self.error, parent=self)
+        self._run_js_requested.connect(self._run_js_on_gui_thread)
+        self._run_js_async_requested.connect(self._run_js_async_on_gui_thread)
+
+        # State shared with the page ... mutations are sent as JSON-patch deltas with each outbound batch
+        self.state_store = StateStore(request_flush_fn=self.outbound_queue.request_flush)
+        self.outbound_queue.add_flush_hook(self.state_store.take_patch_messages)
+
+        # Memoized values derived from the state, which the page can subscribe to by name
+        self.computed_values = ComputedValueGraph(self.state_store,
+                                                  request_flush_fn=self.outbound_queue.request_flush)
+        self.outbound_queue.add_flush_hook(self.computed_values.take_changed_messages)
+
+        # Per op call counts, latencies and message sizes ... see get_op_stats() and the "pweg_stats" op
+        self.op_metrics = OpMetrics()
+        self.js_python_call_handler.set_op_metrics(self.op_metrics)
+        self.dump_op_stats_on_close = dump_op_stats_on_close
+
         self.channel = QWebChannel()
 
         # Make the handler object available, naming it "python_bridge"
@@ -109,6 +331,22 @@ class WebEngineDialogBase(QDialog):
         self.web_engine_page.setWebChannel(self.channel)
         self.web_engine_view.setPage(self.web_engine_page)
 
+        # JS ops and run_js() calls made before pweg.init() has connected the web channel (e.g. from a
+        # sub-class __init__) are held and sent in order once it has
+        self.is_channel_ready = False
+        self.run_js_before_ready_list = []
+        self.js_python_call_handler.channel_connected.connect(self._channel_connected)
+        self.web_engine_page.loadStarted.connect(self._page_load_started)
+
+        # Serve Python registered resources (bytes, files, streams) to the page through "pweg://" URLs
+        self.url_scheme_handler = get_url_scheme_handler()
+        self.url_namespace = self.url_scheme_handler.new_namespace()
+        self.typed_array_buffer_ids = itertools.count(1)
+
+        # hash of the fragment last sent with patch_html(), per target element id
+        self.html_hash_by_target_id = {}
+        self.html_patch_stats = {'sent': 0, 'skipped_unchanged': 0}
+
         # Create layout and add widgets
         layout = QVBoxLayout()
         layout.setContentsMargins(QMargins(0, 0, 0, 0))
@@ -125,11 +363,7 @@ class WebEngineDialogBase(QDialog):
 
         self.session_id = 'pxlc_PWEG_%s_%s_%s' % (self.app_code, getpass.getuser(), self.session_start_dt_str)
 
-        _temp_root = os.path.expandvars('${HOME}/.pxlc_temp')
-        if sys.platform == 'win32':
-            _temp_root = '%s/_pxlc_temp' % os.path.expandvars(
-                                                '${USERPROFILE}/AppData/Local/Temp').replace('\\', '/')
-        self.session_temp_root = '%s/%s' % (_temp_root, self.session_id)
+        self.session_temp_root = '%s/%s' % (get_user_temp_root(), self.session_id)
         os.makedirs(self.session_temp_root)
 
         # Set up log file for the session
@@ -155,13 +389,25 @@ class WebEngineDialogBase(QDialog):
         self.logger.setLevel( log_level )
         self._setup_logger(self.logger, self.log_filepath, log_level, log_to_shell=log_to_shell)
 
+        # Opt-in local cache for external (e.g. CDN) scripts, stylesheets and fonts the page loads
+        self.asset_cache = None
+        if cache_external_assets:
+            if PWEG_URL_SCHEME_IS_REGISTERED:
+                self.asset_cache = get_asset_cache('%s/asset_cache' % get_user_temp_root(),
+                                                   seed_dirpath=asset_cache_seed_dirpath,
+                                                   offline_only=asset_cache_offline_only,
+                                                   warning_fn=self.warning)
+            else:
+                self.warning('External asset cache not available ... import pweg before creating the QApplication')
+
         # Set up Plugin Manager
-        all_plugins_html_str = ''
         self.plugin_manager = None
 
         if requested_plugins_list:
             self.plugin_manager = PluginManager(self, requested_plugins_list)
-            all_plugins_html_str = self.plugin_manager.get_all_plugins_html_str()
+
+        # Assembled pages (template + plugin markup) are cached across launches, keyed by all of their inputs
+        self.page_cache = get_page_cache('%s/page_cache' % get_user_temp_root()) if use_page_cache else None
 
         # Set up HTML template vars before loading html file
         self.html_template_vars = {
@@ -171,7 +417,13 @@ class WebEngineDialogBase(QDialog):
         }
         self.html_template_vars.update(self.setup_extra_template_vars())
 
-        self.load_html_template_file(self.html_filepath, all_plugins_html=all_plugins_html_str)
+        self.load_html_template_file(self.html_filepath)
+
+        # Opt-in hot reload while developing a tool ... the app template and plugin components are watched
+        # and changes are swapped into the open page (see _watched_files_changed())
+        self.file_watcher = None
+        if watch_for_changes:
+            self._start_watching_files()
 
         # Set up op regsitry of method calls to be called from JavaScript
         self.op_registry = {}
@@ -182,6 +434,21 @@ class WebEngineDialogBase(QDialog):
 
         self.js_python_call_handler.set_op_registry(self.op_registry)
 
+        # Ops registered with background=True run on this thread pool instead of the GUI thread
+        self.op_executor = OpExecutor(self._background_op_completed, self._op_chunk_produced,
+                                      max_thread_count=max_background_op_threads, parent=self)
+        self.js_python_call_handler.set_op_executor(self.op_executor)
+
+        # Ops registered with priority="bulk" are queued and rate limited so they can't hold up interactive ops
+        self.op_scheduler = OpScheduler(self._queued_op_shed, bulk_ops_per_sec=bulk_ops_per_sec,
+                                        bulk_max_queue_depth=bulk_max_queue_depth, bulk_overflow=bulk_overflow,
+                                        parent=self)
+        self.js_python_call_handler.set_op_scheduler(self.op_scheduler)
+
+        # Results of ops registered with the cache option are memoized here
+        self.op_result_cache = OpResultCache()
+        self.js_python_call_handler.set_op_result_cache(self.op_result_cache)
+
     def _setup_logger(self, logger, log_filepath, logging_level, log_to_shell=False):
 
         log_formatter = logging.Formatter("%(asctime)s [%(levelname)-5.5s]:  %(message)s")
@@ -210,6 +477,61 @@ class WebEngineDialogBase(QDialog):
                 print('    adding op: %s' % op_name)
                 self.op_registry[op_name] = op_method
 
+    def _background_op_completed(self, request_id, op_name, result_data):
+
+        try:
+            self.call_js_op('PWEG_op_result', {'request_id': request_id, 'op': op_name, 'result': result_data})
+        except (TypeError, ValueError) as err:
+            # the result is not JSON serializable ... still settle the JS promise, with an error result
+            self.call_js_op('PWEG_op_result', {'request_id': request_id, 'op': op_name, 'result': {
+                'ret_status': 'ERROR',
+                'message': 'Result of background op "%s" is not JSON serializable: %s' % (op_name, err)
+            }})
+
+    def _queued_op_shed(self, request_id, op_name):
+
+        self.call_js_op('PWEG_op_result', {'request_id': request_id, 'op': op_name,
+                                           'result': {'ret_status': 'SHED',
+                                                      'message': 'Op dropped from the full bulk op queue'}})
+
+    def _op_chunk_produced(self, request_id, op_name, chunk):
+
+        try:
+            self.call_js_op('PWEG_op_chunk', {'request_id': request_id, 'op': op_name, 'chunk': chunk})
+        except (TypeError, ValueError) as err:
+            # the chunk is not JSON serializable ... end the stream for this request with an error result (the
+            # cancel keeps its final result from being sent as well, and stops the op if no one else wants it)
+            self.op_executor.cancel(request_id)
+            self.call_js_op('PWEG_op_result', {'request_id': request_id, 'op': op_name, 'result': {
+                'ret_status': 'ERROR',
+                'message': 'Chunk of streaming op "%s" is not JSON serializable: %s' % (op_name, err)
+            }})
+
+    def invalidate_op_cache(self, op_name=None, key_predicate=None):
+
+        # drop memoized op results ... all of them, those of one op, and/or those where
+        # key_predicate(op_name, op_data) returns True. Returns the number of results dropped.
+        return self.op_result_cache.invalidate(op_name=op_name, key_predicate=key_predicate)
+
+    def get_op_cache_stats(self):
+
+        # hit/miss/eviction counts and current size, per op name
+        return self.op_result_cache.get_stats()
+
+    def get_op_stats(self):
+
+        op_stats = self.op_metrics.get_stats()
+        op_stats['bulk_queue'] = self.op_scheduler.get_stats()
+        op_stats['outbound_queue'] = self.outbound_queue.get_stats()
+        op_stats['state_store'] = self.state_store.get_stats()
+        op_stats['computed_values'] = self.computed_values.get_stats()
+        op_stats['html_patches'] = dict(self.html_patch_stats)
+        if self.page_cache:
+            op_stats['page_cache'] = self.page_cache.get_stats()
+        if self.asset_cache:
+            op_stats['asset_cache'] = self.asset_cache.get_stats()
+        return op_stats
+
     def get_plugin_instance(self, plugin_name):
 
         if not self.plugin_manager:
@@ -257,22 +579,63 @@ class WebEngineDialogBase(QDialog):
         url = QUrl.fromLocalFile(filepath)
         self.web_engine_view.load(url)
 
-    def load_html_template_file(self, template_filepath, all_plugins_html=''):
+    def is_page_cacheable(self, template_filepath):
 
-        template_dir = os.path.dirname(os.path.abspath(template_filepath))
-        template_filename = os.path.basename(template_filepath)
+        # Override to return False when the page can't be served from the page cache, e.g. when template vars
+        # hold per-session values (which would make every launch miss and leave one more entry on disk)
+        return True
 
-        j2_env = jinja2.Environment(loader=jinja2.FileSystemLoader(template_dir))
-        html_str = j2_env.get_template(template_filename).render(self.html_template_vars)
+    def assemble_page_html(self, template_filepath, all_plugins_html=None):
+
+        # Renders the template and adds the plugin markup (from the plugin manager unless all_plugins_html is
+        # given) ... served from the page cache when none of the inputs changed
+        page_cache_key = None
+        if self.page_cache and all_plugins_html is None and self.is_page_cacheable(template_filepath):
+            plugin_key_info = self.plugin_manager.get_page_cache_key_info() if self.plugin_manager else None
+            j2_env = get_template_environment(os.path.dirname(os.path.abspath(template_filepath)))
+            page_cache_key = self.page_cache.make_key(template_filepath, self.html_template_vars, plugin_key_info,
+                                                      j2_env=j2_env)
+            html_str = self.page_cache.lookup(page_cache_key) if page_cache_key else None
+            if html_str is not None:
+                self.debug('Page for "%s" served from page cache' % template_filepath)
+                return html_str
+
+        if all_plugins_html is None:
+            all_plugins_html = self.plugin_manager.get_all_plugins_html_str() if self.plugin_manager else ''
+
+        template_dir = os.path.dirname(os.path.abspath(template_filepath))
+        j2_env = get_template_environment(template_dir)
+        html_str = j2_env.get_template(os.path.basename(template_filepath)).render(self.html_template_vars)
 
         if all_plugins_html:
             html_str = html_str.replace('</body>', '%s\n\n</body>' % all_plugins_html)
             html_str = html_str.replace('</BODY>', '%s\n\n</BODY>' % all_plugins_html)
 
+        if page_cache_key:
+            self.page_cache.store(page_cache_key, html_str)
+        return html_str
+
+    def load_html_template_file(self, template_filepath, all_plugins_html=None):
+
+        template_dir = os.path.dirname(os.path.abspath(template_filepath))
+        template_filename = os.path.basename(template_filepath)
+
+        html_str = self.assemble_page_html(template_filepath, all_plugins_html=all_plugins_html)
+
         # NOTE: cannot use .setHtml() to load the html string ... external resourses (like css and js) do not load!
         # self.web_engine_view.setHtml(html_str)
 
-        # instead we'll write out a temp HTML file and load that
+        if PWEG_URL_SCHEME_IS_REGISTERED:
+            # serve the page from memory ... its URL is inside the template directory (which is served too), so
+            # resources relative to the template resolve as they would for the template file itself
+            self.url_scheme_handler.add_directory(self.url_namespace, 'app', template_dir)
+            page_url = self.url_scheme_handler.add_bytes(self.url_namespace, 'app/%s' % template_filename,
+                                                         html_str.encode('utf-8'), mime_type='text/html')
+            self.web_engine_view.load(QUrl(page_url))
+            return
+
+        # otherwise (the "pweg" scheme could not be registered, e.g. when running inside a DCC) pages from it can't
+        # load file:// resources, so we'll write out a temp HTML file and load that
         temp_filename = 'pxlc_wew_generated_page_%s.html' % datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
         temp_html_filepath = '%s/%s' % (self.session_temp_root, temp_filename)
 
@@ -281,17 +644,325 @@ class WebEngineDialogBase(QDialog):
 
         self._load_html_file_url(temp_html_filepath)
 
+    # --------------------------------------------------------------------------------------------------------
+    #  HTML fragments rendered with jinja2 ... fragment templates are compiled once per process (keyed by their
+    #  source) and autoescaped, since they are usually filled in with data. E.g.
+    #
+    #      BTN_TEMPLATE = '<button onclick="launch_app({{ item.app|tojson }});">{{ item.label }}</button>'
+    #      self.insert_fragment('app_buttons_div', self.render_fragment_list(BTN_TEMPLATE, app_info_list))
+    # --------------------------------------------------------------------------------------------------------
+    _fragment_j2_env = jinja2.Environment(autoescape=True)
+    _fragment_template_by_source = {}
+
+    @classmethod
+    def get_fragment_template(cls, template_str):
+
+        fragment_template = cls._fragment_template_by_source.get(template_str)
+        if fragment_template is None:
+            fragment_template = cls._fragment_j2_env.from_string(template_str)
+            cls._fragment_template_by_source[template_str] = fragment_template
+        return fragment_template
+
+    def render_fragment(self, template_str, **template_vars):
+
+        return self.get_fragment_template(template_str).render(**template_vars)
+
+    def render_fragment_list(self, item_template_str, item_list, **template_vars):
+
+        # Renders item_template_str once per item (as "item", "loop" is available too) in a single render
+        # pass, and returns the joined HTML
+        list_template_str = '{%% for item in _pweg_item_list %%}%s{%% endfor %%}' % item_template_str
+        return self.get_fragment_template(list_template_str).render(_pweg_item_list=item_list, **template_vars)
+
+    def insert_fragment(self, target_id, html_str, position='append'):
+
+        # Inserts html_str into the element with id target_id as one DocumentFragment. position is "append",
+        # "prepend" or "replace" (replaces the current content). See patch_html() for updating content in
+        # place instead.
+        if position not in ('append', 'prepend', 'replace'):
+            raise ValueError('Unknown fragment insert position "%s"' % position)
+        self.html_hash_by_target_id.pop(target_id, None)  # content no longer matches what patch_html() sent
+        self.call_js_op('PWEG_insert_fragment', {'target_id': target_id, 'html': html_str, 'position': position})
+
+    # --------------------------------------------------------------------------------------------------------
+    #  "pweg://" URL resources ... each register method returns the URL to use in the page, e.g. as the
+    #  src of an <img> or with fetch()
+    # --------------------------------------------------------------------------------------------------------
+    def register_url_bytes(self, url_key, data_bytes, mime_type='application/octet-stream'):
+
+        return self.url_scheme_handler.add_bytes(self.url_namespace, url_key, data_bytes, mime_type=mime_type)
+
+    def register_url_file(self, url_key, filepath, mime_type=None):
+
+        return self.url_scheme_handler.add_file(self.url_namespace, url_key, filepath, mime_type=mime_type)
+
+    def register_url_stream(self, url_key, chunk_generator_fn, mime_type='application/octet-stream'):
+
+        # chunk_generator_fn is called for every request and must return an iterable of bytes chunks
+        return self.url_scheme_handler.add_stream(self.url_namespace, url_key, chunk_generator_fn,
+                                                  mime_type=mime_type)
+
+    def register_url_directory(self, url_key, dirpath):
+
+        # every file below dirpath, as "<returned URL>/<relative path>"
+        return self.url_scheme_handler.add_directory(self.url_namespace, url_key, dirpath)
+
+    def unregister_url(self, url_key):
+
+        self.url_scheme_handler.remove(self.url_namespace, url_key)
+
+    def closeEvent(self, event):
+
+        self._close_down()
+        super(WebEngineDialogBase, self).closeEvent(event)
+
+    def done(self, result_code):
+
+        # Esc, accept() and reject() end up here and only hide the dialog (no close event is sent)
+        self._close_down()
+        super(WebEngineDialogBase, self).done(result_code)
+
+    def _close_down(self):
+
+        if self.is_closed_down:
+            return
+        self.is_closed_down = True
+
+        if self.dump_op_stats_on_close:
+            op_stats_filepath = '%s/op_stats.json' % self.session_temp_root
+            with open(op_stats_filepath, 'w') as out_fp:
+                json.dump(self.get_op_stats(), out_fp, indent=4, sort_keys=True)
+            self.info('Op stats written to "%s"' % op_stats_filepath)
+
+        if self.file_watcher:
+            self.file_change_timer.stop()
+            self.file_watcher.fileChanged.disconnect(self._watched_file_changed)
+            self.file_watcher.deleteLater()
+            self.file_watcher = None
+
+        self.url_scheme_handler.remove_namespace(self.url_namespace)
+
+    def _channel_connected(self):
+
+        self.is_channel_ready = True
+        self.state_store.request_full_sync()  # the page starts with an empty state mirror
+        self.outbound_queue.set_ready(True)
+
+        run_js_before_ready_list = self.run_js_before_ready_list
+        self.run_js_before_ready_list = []
+        for run_js_fn in run_js_before_ready_list:
+            run_js_fn()
+
+        self.debug('Web channel connected (%s queued JS calls sent)' % len(run_js_before_ready_list))
+
+    def _start_watching_files(self):
+
+        self.watched_component_by_filepath = {os.path.abspath(self.html_filepath): (None, 'template')}
+        if self.plugin_manager:
+            for (plugin_name, component, filepath) in self.plugin_manager.get_component_filepath_list():
+                self.watched_component_by_filepath[os.path.abspath(filepath)] = (plugin_name, component)
+
+        self.changed_filepath_set = set()
+        self.missing_check_count_by_filepath = {}
+        self.file_change_timer = QTimer(self)
+        self.file_change_timer.setSingleShot(True)
+        self.file_change_timer.timeout.connect(self._watched_files_changed)
+
+        self.file_watcher = QFileSystemWatcher(self)
+        self.file_watcher.addPaths(list(self.watched_component_by_filepath.keys()))
+        self.file_watcher.fileChanged.connect(self._watched_file_changed)
+        self.info('Watching %s files for changes' % len(self.watched_component_by_filepath))
+
+    def _watched_file_changed(self, filepath):
+
+        # editors often save by replacing the file, which drops it from the watcher, so watch it again
+        if filepath not in self.file_watcher.files() and os.path.exists(filepath):
+            self.file_watcher.addPath(filepath)
+
+        # saves can touch a file more than once, so changes are handled together after a short delay
+        self.changed_filepath_set.add(os.path.abspath(filepath))
+        self.file_change_timer.start(100)
+
+    def _watched_files_changed(self):
+
+        # a file replaced by a save can still be missing when its change comes in, so any watched file the
+        # watcher dropped is watched again here ... one that is still missing is checked again shortly, and
+        # no longer watched once it has been missing for a few checks (i.e. it was deleted)
+        watched_filepath_set = set([os.path.abspath(f) for f in self.file_watcher.files()])
+        for filepath in list(self.watched_component_by_filepath.keys()):
+            if filepath in watched_filepath_set:
+                continue
+            if os.path.exists(filepath):
+                self.file_watcher.addPath(filepath)
+                self.changed_filepath_set.add(filepath)
+                self.missing_check_count_by_filepath.pop(filepath, None)
+                continue
+            missing_check_count = self.missing_check_count_by_filepath.get(filepath, 0) + 1
+            if missing_check_count > self.MAX_WATCHED_FILE_MISSING_CHECKS:
+                self.warning('Hot reload: no longer watching deleted file "%s"' % filepath)
+                del self.watched_component_by_filepath[filepath]
+                del self.missing_check_count_by_filepath[filepath]
+                self.changed_filepath_set.discard(filepath)
+                continue
+            self.missing_check_count_by_filepath[filepath] = missing_check_count
+            self.file_change_timer.start(500)
+
+        changed_filepath_list = sorted([f for f in self.changed_filepath_set if os.path.exists(f)])
+        self.changed_filepath_set = self.changed_filepath_set.difference(changed_filepath_list)
+
+        for filepath in changed_filepath_list:
+            (plugin_name, component) = self.watched_component_by_filepath[filepath]
+            if component == 'template':
+                # the page itself changed, so reload it ... Python side state is kept, and the StateStore is
+                # fully synced to the new page once its web channel connects
+                self.info('Hot reload: reloading page for changed template "%s"' % filepath)
+                self.load_html_template_file(self.html_filepath)
+                return
+
+        for filepath in changed_filepath_list:
+            (plugin_name, component) = self.watched_component_by_filepath[filepath]
+            self.info('Hot reload: swapping in %s of plugin "%s"' % (component.upper(), plugin_name))
+            try:
+                component_str = self.plugin_manager.get_plugin_component_str(plugin_name, component)
+            except (IOError, OSError):
+                continue  # file is gone (e.g. mid save), the next change will pick it up
+            self.call_js_op('PWEG_hot_reload', {'plugin_name': plugin_name, 'component': component,
+                                                'content': component_str})
+
+    def _page_load_started(self):
+
+        # a (re)loading page has no web channel until its pweg.init() runs again
+        self.is_channel_ready = False
+        self.outbound_queue.set_ready(False)
+        self.computed_values.clear_subscriptions()
+        self.html_hash_by_target_id = {}
+
     def run_js(self, js_str):
 
+        # safe to call from any thread
+        if QThread.currentThread() != self.thread():
+            self._run_js_requested.emit(js_str)
+            return
+        self._run_js_on_gui_thread(js_str)
+
+    @Slot(str)
+    def _run_js_on_gui_thread(self, js_str):
+
+        if not self.is_channel_ready:
+            self.run_js_before_ready_list.append(lambda: self._run_js_on_gui_thread(js_str))
+            return
+        self.outbound_queue.flush()  # so JS ops called before this run first
         self.web_engine_page.runJavaScript(js_str)
 
+    def run_js_async(self, js_str, timeout_secs=None):
+
+        # Runs js_str in the page and returns a JSCallFuture of its result value (converted to Python, e.g.
+        # a JS object becomes a dict). Safe to call from any thread. With timeout_secs, the future fails with
+        # JSCallTimeoutError if the page hasn't answered by then.
+        js_call_future = JSCallFuture()
+        if QThread.currentThread() != self.thread():
+            self._run_js_async_requested.emit(js_str, js_call_future, timeout_secs)
+        else:
+            self._run_js_async_on_gui_thread(js_str, js_call_future, timeout_secs)
+        return js_call_future
+
+    @Slot(str, object, object)
+    def _run_js_async_on_gui_thread(self, js_str, js_call_future, timeout_secs):
+
+        if timeout_secs is not None:
+            QTimer.singleShot(int(timeout_secs * 1000), lambda: js_call_future.set_exception(
+                JSCallTimeoutError('JavaScript call did not complete within %s seconds' % timeout_secs)))
+
+        if not self.is_channel_ready:
+            self.run_js_before_ready_list.append(
+                lambda: self.web_engine_page.runJavaScript(js_str, js_call_future.set_result))
+            return
+        self.outbound_queue.flush()  # so JS ops called before this run first
+        self.web_engine_page.runJavaScript(js_str, js_call_future.set_result)
+
+    def call_js_function(self, js_function_name, *args, **kwargs):
+
+        # Calls a JS function (e.g. "pweg.MyPlugin.get_state") with JSON-able args and returns a JSCallFuture
+        # of its return value ... an exception thrown in JS fails the future with JSCallError. Takes the
+        # same timeout_secs keyword arg as run_js_async().
+        js_args_str = ', '.join([self.message_codec.encode(arg) for arg in args])
+        js_str = '(function() { try { return {"ok": true, "value": %s(%s)}; } ' \
+                 'catch(err) { return {"ok": false, "error": String(err)}; } })()' % (js_function_name, js_args_str)
+
+        function_future = JSCallFuture()
+
+        def _on_wrapped_result(js_call_future):
+            try:
+                wrapped_result = js_call_future.result(timeout_secs=0)
+            except Exception as err:
+                function_future.set_exception(err)
+                return
+            if not wrapped_result or not wrapped_result.get('ok'):
+                error_msg = wrapped_result.get('error') if wrapped_result else 'no result returned'
+                function_future.set_exception(JSCallError('JS function "%s" failed: %s' %
+                                                          (js_function_name, error_msg)))
+                return
+            function_future.set_result(wrapped_result.get('value'))
+
+        self.run_js_async(js_str, timeout_secs=kwargs.get('timeout_secs')).add_done_callback(_on_wrapped_result)
+        return function_future
+
     def call_js_op(self, js_op_name, js_op_data_d):
 
-        b64_data_str = base64.b64encode(json.dumps(js_op_data_d, sort_keys=True).encode('ascii')).decode('ascii')
-        js_str_to_run = 'pweg.call_js_op("%s", "%s")' % (js_op_name, b64_data_str)
-        self.run_js(js_str_to_run)
+        # safe to call from any thread ... the op data is encoded here and the message delivered with the
+        # next batch (see OutboundMessageQueue)
+        start_time = perf_timer()
+        js_op_data_str = self.message_codec.encode(js_op_data_d)
 
-    @register_op
+        self.op_metrics.record('to_js', js_op_name, {'encode': perf_timer() - start_time},
+                               request_size=len(js_op_data_str))
+        self.outbound_queue.put(js_op_name, js_op_data_str)
+
+    def call_js_op_with_arrays(self, js_op_name, js_op_data_d):
+
+        # Like call_js_op(), but array-like values anywhere in js_op_data_d (array.array, memoryview, numpy
+        # arrays) are sent as raw little-endian buffers and arrive in the JS op as typed arrays (Float32Array,
+        # Int32Array, ...) ... use to_columns() from pweg.TypedArrays to send a table column by column.
+        # JS ops sent after this one are held in the page until its buffers have arrived, so order is kept.
+        typed_op_data_d = {'op': js_op_name,
+                           'op_data': replace_typed_arrays(js_op_data_d, self._add_typed_array_buffer)}
+        self.call_js_op('PWEG_typed_op', typed_op_data_d)
+
+    def _add_typed_array_buffer(self, buffer_bytes):
+
+        if not PWEG_URL_SCHEME_IS_REGISTERED:
+            return None  # fetch() can't read from an unregistered scheme, so the buffer gets embedded
+
+        url_key = 'pweg_typed_array/%s' % next(self.typed_array_buffer_ids)
+        return self.url_scheme_handler.add_bytes(self.url_namespace, url_key, buffer_bytes, serve_once=True)
+
+    def call_js_op_conflated(self, conflation_key, js_op_name, js_op_data_d):
+
+        # Like call_js_op(), but latest-wins per conflation_key ... for high frequency updates (progress,
+        # counters, live previews) only the newest pending value is delivered with each batch, i.e. at most
+        # about one update per frame. Safe to call from any thread, but don't modify js_op_data_d afterwards.
+        self.op_metrics.record('to_js', js_op_name, {})
+        self.outbound_queue.put_conflated(conflation_key, js_op_name, js_op_data_d)
+
+    def patch_html(self, target_id, html_str, force=False):
+
+        # Sets the content of the element with id target_id to html_str, through pweg.patch_html() which
+        # morphs the live DOM into the new fragment (only changed nodes/attributes are touched, so focus,
+        # scroll position and input state survive). Nothing is sent when html_str is the same as the last
+        # fragment sent for target_id, unless force is True (e.g. when JS changed the content itself).
+        # Safe to call from any thread; latest-wins per target_id like call_js_op_conflated().
+        html_hash = hashlib.sha1(html_str.encode('utf-8')).hexdigest()
+        if not force and self.html_hash_by_target_id.get(target_id) == html_hash:
+            self.html_patch_stats['skipped_unchanged'] += 1
+            return False
+
+        self.html_hash_by_target_id[target_id] = html_hash
+        self.html_patch_stats['sent'] += 1
+        self.call_js_op_conflated('PWEG_patch_html|%s' % target_id, 'PWEG_patch_html',
+                                  {'target_id': target_id, 'html': html_str})
+        return True
+
+    @register_op(priority=OpPriorities.BULK)
     def print_from_js(self, op_data):
 
         log_level = op_data.get('log_level', 'INFO')
@@ -300,4 +971,24 @@ class WebEngineDialogBase(QDialog):
         print('[%s] %s' % (log_level, message))
         return {'ret_status': 'OK'}
 
+    @register_op
+    def pweg_subscribe_computed(self, op_data):
+
+        # used by pweg.subscribe_computed() ... returns the current value, changes follow as JS ops
+        try:
+            value = self.computed_values.subscribe(op_data.get('name'))
+        except KeyError as err:
+            return {'ret_status': 'ERROR', 'message': err.args[0]}
+        return {'ret_status': 'OK', 'value': value}
+
+    @register_op
+    def pweg_unsubscribe_computed(self, op_data):
+
+        self.computed_values.unsubscribe(op_data.get('name'))
+        return {'ret_status': 'OK'}
+
+    @register_op
+    def pweg_stats(self, op_data):
 
+        # built-in op so the page (or dev tools console) can inspect op metrics
+        return {'ret_status': 'OK', 'op_stats': self.get_op_stats()}
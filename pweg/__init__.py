@@ -1,6 +1,10 @@
 
 from .WebEngineDialogBase import WebEngineDialogBase
 from .PluginBase import PluginBase
+from .OpExecutor import OpCancelToken
+from .OpScheduler import OpPriorities
+from .JSCallFuture import JSCallFuture, JSCallError, JSCallTimeoutError
+from .TypedArrays import to_columns
 
 from .util import launch_main_app, launch_as_dialog, register_op, register_plugin_op
 
@@ -9,28 +9,94 @@ sys.path.insert(0, '%s/thirdparty_packages' % _PWEG_ROOT)  # to include QtPy pac
 from qtpy.QtWidgets import QApplication, QWidget, QMessageBox, QMainWindow
 
 
+def write_file_atomically(filepath, data_bytes):
+
+    # written under a temp name and then renamed, so other processes (e.g. other sessions sharing a cache
+    # directory) never read a partially written file
+    temp_filepath = '%s.%s.tmp' % (filepath, os.getpid())
+    with open(temp_filepath, 'wb') as fp:
+        fp.write(data_bytes)
+    getattr(os, 'replace', os.rename)(temp_filepath, filepath)
+
+
 # --------------------------------------------------------------
 #  Op method registry decorator
+#
+#  Can be used bare or with options, e.g.
+#
+#      @register_op
+#      def my_op(self, op_data): ...
+#
+#      @register_op(background=True)
+#      def my_slow_op(self, op_data): ...
+#
+#  background=True runs the op on the dialog's op thread pool and
+#  delivers its result to the JS response handler on completion.
+#
+#  cache=True (or a dict with "max_size" and/or "ttl" in seconds)
+#  memoizes op results keyed by op_data ... see OpResultCache.
+#
+#  coalesce=True makes concurrent background calls with the same
+#  op_data share one execution (only applies with background=True,
+#  as GUI thread ops never overlap).
+#
+#  An op may also be a generator ... each yielded chunk is sent to
+#  the page as it is produced (see pweg.to_python_stream() in JS).
+#
+#  cancellable=True passes an OpCancelToken as a second argument,
+#  i.e. my_op(self, op_data, cancel_token), to be polled by ops
+#  that JS may cancel through the handle pweg.to_python() returns.
+#
+#  priority is "interactive", "normal" (default) or "bulk" (see
+#  OpPriorities) ... bulk ops are queued and rate limited.
 # --------------------------------------------------------------
-def register_op(op_method):
+def _get_op_options(background, cache, coalesce, cancellable, priority):
+
+    if cache is True:
+        cache = {}
+    return {'background': background, 'cache': cache, 'coalesce': coalesce, 'cancellable': cancellable,
+            'priority': priority}
+
+
+def register_op(op_method=None, background=False, cache=None, coalesce=False, cancellable=False,
+                priority='normal'):
 
-    def registered_op_method(cls_instance, op_data):
-        return op_method(cls_instance, op_data)
+    op_options = _get_op_options(background, cache, coalesce, cancellable, priority)
 
-    registered_op_method._op_name = str(op_method).split()[1]
-    return registered_op_method
+    def decorate_op_method(op_method):
+
+        def registered_op_method(cls_instance, op_data, *args):
+            return op_method(cls_instance, op_data, *args)
+
+        registered_op_method._op_name = str(op_method).split()[1]
+        registered_op_method._op_options = op_options
+        return registered_op_method
+
+    if op_method is None:
+        return decorate_op_method
+    return decorate_op_method(op_method)
 
 
 # --------------------------------------------------------------
-#  Plugin Op method registry decorator
+#  Plugin Op method registry decorator (same options as register_op)
 # --------------------------------------------------------------
-def register_plugin_op(plugin_op_method):
+def register_plugin_op(plugin_op_method=None, background=False, cache=None, coalesce=False,
+                       cancellable=False, priority='normal'):
+
+    op_options = _get_op_options(background, cache, coalesce, cancellable, priority)
+
+    def decorate_plugin_op_method(plugin_op_method):
+
+        def registered_plugin_op_method(plugin_cls_instance, op_data, *args):
+            return plugin_op_method(plugin_cls_instance, op_data, *args)
 
-    def registered_plugin_op_method(plugin_cls_instance, op_data):
-        return plugin_op_method(plugin_cls_instance, op_data)
+        registered_plugin_op_method._plugin_op_name = str(plugin_op_method).split()[1]
+        registered_plugin_op_method._op_options = op_options
+        return registered_plugin_op_method
 
-    registered_plugin_op_method._plugin_op_name = str(plugin_op_method).split()[1]
-    return registered_plugin_op_method
+    if plugin_op_method is None:
+        return decorate_plugin_op_method
+    return decorate_plugin_op_method(plugin_op_method)
 
 
 def launch_main_app(custom_subclass_cls, **kwargs):
@@ -0,0 +1,165 @@
+import os
+import copy
+import unittest
+import importlib.util
+
+# loaded by path, so the test runs without Qt (importing the pweg package pulls in QtWebEngine)
+_STATE_STORE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                 'pweg', 'StateStore.py')
+_spec = importlib.util.spec_from_file_location('StateStore', _STATE_STORE_PATH)
+StateStore = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(StateStore)
+
+
+def apply_patch(mirror_d, patch_list):
+
+    # same semantics as pweg._apply_state_patch() in js/PyWebEngineGui.js
+    for patch in patch_list:
+        key_list = StateStore.split_state_path(patch['path'])
+        if not key_list:
+            mirror_d = {} if patch['op'] == 'remove' else copy.deepcopy(patch['value'])
+            continue
+        container = mirror_d
+        for key in key_list[:-1]:
+            container = container[int(key)] if isinstance(container, list) else container[key]
+        last_key = int(key_list[-1]) if isinstance(container, list) else key_list[-1]
+        if patch['op'] == 'remove':
+            del container[last_key]
+        else:
+            container[last_key] = copy.deepcopy(patch['value'])
+    return mirror_d
+
+
+class StateStorePatchTest(unittest.TestCase):
+
+    def _flush(self, state_store, mirror_d):
+
+        return apply_patch(mirror_d, state_store.take_patch_messages()[0][1])
+
+    def test_set_records_only_differences(self):
+
+        state_store = StateStore.StateStore()
+        state_store.set('/shot', {'name': 'sh010', 'frames': [1001, 1100], 'status': 'wip'})
+        state_store.take_patch_messages()
+
+        state_store.set('/shot', {'name': 'sh010', 'frames': [1001, 1120], 'notes': 'ok'})
+        self.assertEqual(state_store.take_patch_messages()[0][1], [
+            {'op': 'remove', 'path': '/shot/status'},
+            {'op': 'replace', 'path': '/shot/frames/1', 'value': 1120},
+            {'op': 'add', 'path': '/shot/notes', 'value': 'ok'},
+        ])
+
+    def test_unchanged_set_sends_nothing(self):
+
+        state_store = StateStore.StateStore()
+        state_store.set('/a', {'x': 1})
+        state_store.take_patch_messages()
+
+        state_store.set('/a', {'x': 1})
+        self.assertIsNone(state_store.take_patch_messages())
+
+    def test_repeated_set_sends_latest_value_once(self):
+
+        state_store = StateStore.StateStore()
+        state_store.set('/progress', 0)
+        state_store.take_patch_messages()
+
+        for value in range(1, 5):
+            state_store.set('/progress', value)
+        self.assertEqual(state_store.take_patch_messages()[0][1],
+                         [{'op': 'replace', 'path': '/progress', 'value': 4}])
+
+    def test_set_update_delete_keep_mirror_in_sync(self):
+
+        state_store = StateStore.StateStore()
+        mirror_d = {}
+
+        state_store.set('/shots/sh010/status', 'wip')
+        state_store.set('/user', 'pxlc')
+        mirror_d = self._flush(state_store, mirror_d)
+        self.assertEqual(mirror_d, state_store.get_snapshot())
+
+        state_store.update('/shots/sh010', {'status': 'done', 'frames': [1001, 1100]})
+        state_store.set('/shots/sh020', {'status': 'wip'})
+        state_store.delete('/user')
+        state_store.delete('/missing/key')  # nothing to delete, nothing recorded
+        mirror_d = self._flush(state_store, mirror_d)
+
+        self.assertEqual(mirror_d, {'shots': {'sh010': {'status': 'done', 'frames': [1001, 1100]},
+                                              'sh020': {'status': 'wip'}}})
+        self.assertEqual(mirror_d, state_store.get_snapshot())
+
+    def test_keys_are_escaped_in_paths(self):
+
+        state_store = StateStore.StateStore()
+        state_store.set(['a/b', 'c~d'], 1)
+
+        self.assertEqual([p['path'] for p in state_store.take_patch_messages()[0][1]], ['/a~1b', '/a~1b/c~0d'])
+        self.assertEqual(state_store.get('/a~1b/c~0d'), 1)
+
+    def test_full_sync_replaces_root(self):
+
+        state_store = StateStore.StateStore()
+        state_store.set('/a', 1)
+        state_store.request_full_sync()
+
+        self.assertEqual(state_store.take_patch_messages()[0][1],
+                         [{'op': 'replace', 'path': '', 'value': {'a': 1}}])
+
+    def test_change_listener_gets_changed_paths(self):
+
+        changed_path_lists = []
+        state_store = StateStore.StateStore()
+        state_store.add_change_listener(changed_path_lists.append)
+
+        state_store.set('/a', {'x': 1})
+        state_store.set('/a', {'x': 1})  # unchanged, no call
+        state_store.delete('/a/x')
+
+        self.assertEqual(changed_path_lists, [['/a'], ['/a/x']])
+
+
+class StateStoreListRemoveTest(unittest.TestCase):
+
+    def _synced_store(self):
+
+        state_store = StateStore.StateStore()
+        state_store.set('/l', [1, 2, 3])
+        mirror_d = apply_patch({}, state_store.take_patch_messages()[0][1])
+        return (state_store, mirror_d)
+
+    def _flush(self, state_store, mirror_d):
+
+        return apply_patch(mirror_d, state_store.take_patch_messages()[0][1])
+
+    def test_delete_same_index_twice(self):
+
+        (state_store, mirror_d) = self._synced_store()
+        state_store.delete('/l/1')
+        state_store.delete('/l/1')
+
+        self.assertEqual(state_store.get('/l'), [1])
+        self.assertEqual(self._flush(state_store, mirror_d), state_store.get_snapshot())
+
+    def test_delete_then_set_same_index(self):
+
+        (state_store, mirror_d) = self._synced_store()
+        state_store.delete('/l/0')
+        state_store.set('/l/0', 9)
+
+        self.assertEqual(state_store.get('/l'), [9, 3])
+        self.assertEqual(self._flush(state_store, mirror_d), state_store.get_snapshot())
+
+    def test_dict_patches_still_superseded(self):
+
+        (state_store, mirror_d) = self._synced_store()
+        state_store.set('/d/x', 1)
+        state_store.set('/d/x', 2)
+
+        patch_list = state_store.take_patch_messages()[0][1]
+        self.assertEqual([p['path'] for p in patch_list], ['/d', '/d/x'])
+        self.assertEqual(apply_patch(mirror_d, patch_list), state_store.get_snapshot())
+
+
+if __name__ == '__main__':
+    unittest.main()